@@ -1,5 +1,5 @@
 #!/usr/bin/python
-__all__ = ['forms', 'basicwidgets']
+__all__ = ['forms', 'basicwidgets', 'artifacts', 'benchmarks', 'bulkrender', 'catalogs', 'clientrules', 'codegen', 'escaping', 'fingerprints', 'loadtest', 'registry', 'schemas', 'subforms', 'templates', 'values']
 
 __doc__  = '''
 A web form generation package designed to interoperate with U{FormEncode<http://formencode.org>}.
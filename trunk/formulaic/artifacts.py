@@ -0,0 +1,251 @@
+#!/usr/bin/python
+"""
+artifacts - Prerendered, precompressed forms for the formulaic form generation
+toolkit
+Copyright (C) 2005 Greg Steffensen, greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+import os
+import gzip
+from cStringIO import StringIO
+
+from fingerprints import etagMatches
+
+__doc__ = '''First views of forms, rendered and compressed ahead of time.
+
+A form viewed for the first time (with no values submitted, so that
+I{smartRender} shows no errors) renders identically for everyone.  An
+L{ArtifactStore} renders the first view of every form in a
+L{registry.FormRegistry} once, compresses it with gzip, and keeps both versions
+in memory and, optionally, in files named after the form's fingerprint (see
+L{forms.BaseForm.fingerprint}), which a web server can send straight from
+disk::
+
+    artifacts = artifacts.ArtifactStore(forms, directory='/var/cache/forms/html')
+    artifacts.build()
+    ...
+    def application(environ, start_response):
+        return artifacts.serve('signup', environ, start_response)
+
+Artifacts are regenerated when they are fetched after their form's definition
+has changed, and only then: fetching an artifact costs one comparison of
+fingerprints, which forms keep up to date as they change.'''
+
+def compress(data, level=9):
+    '''Compress data with gzip.  The result only depends on the data and the
+    level (no timestamp or file name is stored), so the same form always
+    compresses to the same file.
+
+    @param data: the data to compress
+    @type data: str
+    @param level: the compression level, from 1 (fastest) to 9 (smallest)
+    @type level: int
+    @rtype: str
+    '''
+    output = StringIO()
+    try:
+        compressed = gzip.GzipFile('', 'wb', level, output, mtime=0)
+    except TypeError: # python 2.6 and older can't leave the time out
+        compressed = gzip.GzipFile('', 'wb', level, output)
+    try:
+        compressed.write(data)
+    finally:
+        compressed.close()
+    return output.getvalue()
+
+class Artifact(object):
+    '''The prerendered first view of a form.
+
+    @ivar name: the name of the form in its registry
+    @ivar fingerprint: the fingerprint of the form's definition when it was
+    rendered
+    @ivar etag: the entity tag of the rendering (the same as the form's etag
+    method gives for an empty submission in the store's encoding)
+    @ivar gzipEtag: the entity tag of the compressed rendering, which (being
+    a different sequence of bytes) has to have a different one
+    @ivar body: the rendering, encoded
+    @ivar gzipped: the rendering, compressed with gzip
+    @ivar path: the file the rendering is stored in, or None
+    @ivar gzipPath: the file the compressed rendering is stored in, or None
+    '''
+
+    def __init__(self, name, fingerprint, etag, body, gzipped, path=None, gzipPath=None):
+        self.name = name
+        self.fingerprint = fingerprint
+        self.etag = etag
+        self.gzipEtag = '%s-gz"' % etag[:-1]
+        self.body = body
+        self.gzipped = gzipped
+        self.path = path
+        self.gzipPath = gzipPath
+
+class ArtifactStore(object):
+    '''Prerendered, precompressed first views of the forms in a registry.
+
+    @ivar registry: the L{registry.FormRegistry} of the forms
+    @ivar directory: the directory the artifacts are written to, or None to
+    only keep them in memory
+    @ivar level: the gzip compression level
+    @ivar encoding: the encoding the forms are rendered in
+    @ivar contentType: the value of the Content-Type header sent by L{serve}
+    '''
+
+    def __init__(self, registry, directory=None, level=9, encoding='utf-8'):
+        self.registry = registry
+        self.directory = directory
+        self.level = level
+        self.encoding = encoding
+        self.contentType = 'text/html; charset=%s' % encoding
+        self._artifacts = {}
+
+    def build(self):
+        '''Make sure that the artifacts of every form in the registry are up to
+        date, regenerating those whose forms have changed.
+
+        @return: the names of the forms whose artifacts were regenerated
+        @rtype: list
+        '''
+        regenerated = []
+        for name in self.registry.names():
+            artifact = self._artifacts.get(name)
+            if artifact is None or artifact.fingerprint != self.registry[name].fingerprint():
+                self._generate(name)
+                regenerated.append(name)
+        return regenerated
+
+    def __getitem__(self, name):
+        '''Return the up to date artifact of a form, regenerating it if the form
+        has changed since it was generated.
+
+        @rtype: L{Artifact}
+        '''
+        form = self.registry[name]
+        artifact = self._artifacts.get(name)
+        if artifact is None or artifact.fingerprint != form.fingerprint():
+            artifact = self._generate(name)
+        return artifact
+
+    def _generate(self, name):
+        "Render, compress and store the first view of a form"
+        form = self.registry[name]
+        body = form.renderBytes({}, {}, self.encoding)
+#       rendering can change the form's attributes (i.e. add an enctype), but
+#       never its fingerprint
+        fingerprint = form.fingerprint()
+        artifact = Artifact(name, fingerprint, form.etag({}, {}, encoding=self.encoding), body, compress(body, self.level))
+
+        if self.directory is not None:
+            artifact.path = self._write('%s.%s.html' % (fingerprint, self.encoding), artifact.body)
+            artifact.gzipPath = self._write('%s.%s.html.gz' % (fingerprint, self.encoding), artifact.gzipped)
+
+        previous = self._artifacts.get(name)
+        self._artifacts[name] = artifact
+        if previous is not None and previous.path is not None:
+            self._discard(previous)
+        return artifact
+
+    def _write(self, filename, data):
+        "Write a file into the store's directory, unless it is already there"
+        path = os.path.join(self.directory, filename)
+        if os.path.exists(path):
+            return path
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+#       write to a temporary file first, so that the server never sends a
+#       partially written file
+        temporary = '%s.%d.tmp' % (path, os.getpid())
+        output = open(temporary, 'wb')
+        try:
+            output.write(data)
+        finally:
+            output.close()
+        os.rename(temporary, path)
+        return path
+
+    def _discard(self, artifact):
+        "Remove the files of an artifact that has been replaced, unless another form uses them"
+        for other in self._artifacts.values():
+            if other.path == artifact.path:
+                return
+        for path in (artifact.path, artifact.gzipPath):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def serve(self, name, environ, start_response):
+        '''Serve the first view of a form as a WSGI response: "304 Not
+        Modified" if the client's copy is current, and otherwise the compressed
+        or uncompressed artifact, depending on the request's Accept-Encoding
+        header.  The two are sent with different entity tags (the compressed
+        one's ends in "-gz"), so that caches never mix them up.  Artifacts stored in files are sent with the server's
+        wsgi.file_wrapper, when it has one (which typically uses sendfile).
+
+        @param name: the name of the form in the registry
+        @return: the WSGI response body
+        '''
+        artifact = self[name]
+        gzipped = acceptsGzip(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if gzipped:
+            etag, body, path = artifact.gzipEtag, artifact.gzipped, artifact.gzipPath
+        else:
+            etag, body, path = artifact.etag, artifact.body, artifact.path
+        headers = [('ETag', etag), ('Vary', 'Accept-Encoding')]
+        ifNoneMatch = environ.get('HTTP_IF_NONE_MATCH')
+        if ifNoneMatch and etagMatches(ifNoneMatch, etag):
+            start_response('304 Not Modified', headers)
+            return []
+
+        if gzipped:
+            headers.append(('Content-Encoding', 'gzip'))
+        headers.extend([('Content-Type', self.contentType), ('Content-Length', str(len(body)))])
+        start_response('200 OK', headers)
+
+        fileWrapper = environ.get('wsgi.file_wrapper')
+        if path is not None and fileWrapper is not None:
+            try:
+                return fileWrapper(open(path, 'rb'))
+            except IOError: # removed since, by another process
+                pass
+        return [body]
+
+def acceptsGzip(acceptEncoding):
+    '''Return whether an Accept-Encoding header accepts gzip.
+
+    >>> artifacts.acceptsGzip('deflate, gzip;q=0.5')
+    True
+    >>> artifacts.acceptsGzip('gzip;q=0, *')
+    False
+    >>> artifacts.acceptsGzip('')
+    False
+    '''
+    wildcard = False
+    for item in acceptEncoding.split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+        quality = 1.0
+        for parameter in parts[1:]:
+            key, equals, value = parameter.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding in ('gzip', 'x-gzip'):
+            return quality > 0
+        elif coding == '*':
+            wildcard = quality > 0
+    return wildcard
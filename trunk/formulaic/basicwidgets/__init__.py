@@ -19,7 +19,6 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """
 import widgetclasses as widgets
-from formencode.api import FancyValidator
 import copy
 
 __doc__ = '''Basic implementations of the most common form elements.
@@ -40,11 +39,41 @@ optional attributes as well, such as "needsMultipart" (if the widget needs its
 form to submit with enctype="multipart/mime", as with file upload widgets) and 
 "renderBare" (if the widget needs to be rendered in "bare" mode, as with hidden
 inputs).
+
+Widgets created without a validator are given an instance of
+L{inert.InertValidator}; that module (and with it, formencode) is only imported
+the first time such a widget is created.  The I{InertValidator} name in this
+namespace still works as that class does (for creating instances, isinstance
+checks and subclassing) without importing formencode until it is used.
 '''
 
-class InertValidator(FancyValidator):
-    "A validator that simply returns the original value"
-    pass
+def _inertValidator():
+    from inert import InertValidator
+    return InertValidator
+
+class _InertValidatorAlias(type):
+    "The metaclass of the InertValidator alias, which hands everything on to the real class"
+
+    def __new__(meta, name, bases, namespace):
+        if not [base for base in bases if isinstance(base, _InertValidatorAlias)]:
+            return type.__new__(meta, name, bases, namespace)
+#       subclasses of the alias are subclasses of the real class
+        real = _inertValidator()
+        bases = tuple([isinstance(base, _InertValidatorAlias) and real or base for base in bases])
+        return type(real)(name, bases, namespace)
+
+    def __call__(cls, *args, **kw):
+        return _inertValidator()(*args, **kw)
+
+    def __instancecheck__(cls, instance):
+        return isinstance(instance, _inertValidator())
+
+    def __subclasscheck__(cls, subclass):
+        return issubclass(subclass, _inertValidator())
+
+class InertValidator(object):
+    "Stands in for L{inert.InertValidator}, which it imports when first used"
+    __metaclass__ = _InertValidatorAlias
 
 class _TransformerBase:
     "A callable class used to implement the transformer functions... not intended for direct use by you"
@@ -71,7 +100,7 @@ class _TransformerBase:
 
 #       this makes it simple for users to not do any validation if they don't want to
         if validator is None:
-            widget = InertValidator()
+            widget = _inertValidator()()
         else:
             widget = copy.copy(validator)
 
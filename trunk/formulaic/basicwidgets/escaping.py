@@ -0,0 +1,59 @@
+#!/usr/bin/python
+"""
+escaping - Html escaping for the formulaic form generation toolkit
+Copyright (C) 2005 Greg Steffensen, greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+__doc__ = '''The escape and quoteattr functions of xml.sax.saxutils.
+
+These behave exactly like their saxutils counterparts; they are copied here
+because importing xml.sax.saxutils also imports urllib and the networking
+modules it depends on, which accounts for most of the time it takes to import
+formulaic.'''
+
+def escape(data, entities={}):
+    '''Escape &, <, and > in a string of data, plus any other strings given as
+    the keys of the I{entities} dict.
+
+    >>> escaping.escape('ben & <jerry>')
+    'ben &amp; &lt;jerry&gt;'
+    '''
+    data = data.replace('&', '&amp;')
+    data = data.replace('>', '&gt;')
+    data = data.replace('<', '&lt;')
+    for chars, entity in entities.items():
+        data = data.replace(chars, entity)
+    return data
+
+def quoteattr(data, entities={}):
+    '''Escape and quote an attribute value, choosing the quote character that
+    needs the least escaping.
+
+    >>> escaping.quoteattr('say "hi"')
+    '\\'say "hi"\\''
+    '''
+    entities = entities.copy()
+    entities.update({'\n': '&#10;', '\r': '&#13;', '\t':'&#9;'})
+    data = escape(data, entities)
+    if '"' in data:
+        if "'" in data:
+            data = '"%s"' % data.replace('"', '&quot;')
+        else:
+            data = "'%s'" % data
+    else:
+        data = '"%s"' % data
+    return data
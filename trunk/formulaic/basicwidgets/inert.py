@@ -0,0 +1,28 @@
+#!/usr/bin/python
+"""
+inert.py - The validator of widgets without validation for the formulaic form
+generation toolkit Copyright (C) 2005 Greg Steffensen,
+greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+from formencode.api import FancyValidator
+
+__doc__ = '''The validator given to widgets created without one.  Kept apart from
+the rest of basicwidgets so that formencode is only imported when needed.'''
+
+class InertValidator(FancyValidator):
+    "A validator that simply returns the original value"
+    pass
@@ -20,29 +20,127 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """
 import copy
-from xml.sax.saxutils import quoteattr, escape
+from escaping import quoteattr, escape
 from string import Template
 
 __doc__ = '''Implementation details for the htmlwidgets package.  Doesn't need to
 be accessed directly when using the provided widget functions, but possibly
 useful when writing your own widgets.'''
 
+#   Bumped whenever an attribute of any widget is set, so that forms can tell
+#   when what they have worked out from their widgets is out of date
+generation = 0
+
+#   The attributes of a widget that are often changed in place rather than set,
+#   and that a widget's memo keeps a copy of to tell whether it is out of date
+_MEMO_STATE = ('attrs', 'options', 'optionLabels', 'default')
+
+def _snapshot(value):
+    "Return a shallow copy of a mutable value, to compare the value with later"
+    if isinstance(value, dict):
+        return dict(value)
+    elif isinstance(value, list):
+        return list(value)
+    return value
+
+class _Memo(object):
+    "The remembered output of a widget, and how often it was reused"
+
+    def __init__(self, revision, state=None):
+        self.revision = revision
+        self.state = state
+        self.outputs = {}
+        self.hits = 0
+        self.misses = 0
+
 class Widget:
     "Abstract base class for widgets to inheirit from... handles labels, default values"
 
 #   A place to put extra information about how to render this widget
 
+#   The kind of element the widget renders, as reported by form descriptions
+#   (widgets without one are described by their "type" attribute instead)
+    widgetType = None
+
+#   The generation in which an attribute of this widget was last set
+    revision = 0
+
+#   How many renderings the widget remembers, by name and value, so that
+#   rendering the same name and value again is a dict lookup; 0 (the default)
+#   to not remember any.  Setting any attribute of the widget forgets them, as
+#   does changing its attrs, options, optionLabels or default in place.
+    memoSize = 0
+
+    def __setattr__(self, name, value):
+        global generation
+        self.__dict__[name] = value
+        generation += 1
+        self.__dict__['revision'] = generation
+
     @staticmethod
     def renderAttributes(attrs, **kwargs):
         output = []
         for name, value in attrs.items() + kwargs.items():
-            output.append('%s=%s' % (name, quoteattr(str(value))))
+            output.append('%s=%s' % (name, quoteattr('%s' % (value,))))
         return ' '.join(output)
 
-    def __call__(self, name, value):
+    def _value(self, value):
+        "Return the value to render with, given the value passed in"
         if value is None:
             value = getattr(self, 'default', None)
-        return self._render(name, value or '')
+        return value or ''
+
+    def __call__(self, name, value):
+        if self.memoSize:
+            return self._memoized('', self._call, name, value)
+        return self._call(name, value)
+
+    def _call(self, name, value):
+        return self._render(name, self._value(value))
+
+    def _memoized(self, mode, render, name, value):
+        "Return a rendering from the widget's memo, rendering it with render if it isn't there"
+        memo = self.__dict__.get('_memo')
+        state = [getattr(self, attribute, None) for attribute in _MEMO_STATE]
+        if memo is None or memo.revision != self.revision or memo.state != state:
+#           the memo isn't part of the widget's definition, so it doesn't go
+#           through __setattr__
+            memo = self.__dict__['_memo'] = _Memo(self.revision, map(_snapshot, state))
+        key = (mode, name, type(value), value)
+        try:
+            output = memo.outputs[key]
+        except KeyError:
+            memo.misses += 1
+            if len(memo.outputs) >= self.memoSize:
+                memo.outputs = {}
+            output = memo.outputs[key] = render(name, value)
+            return output
+        except TypeError: # unhashable values (i.e. lists) can't be remembered
+            return render(name, value)
+        memo.hits += 1
+        return output
+
+    def clearMemo(self):
+        "Forget the renderings the widget remembers"
+        memo = self.__dict__.get('_memo')
+        if memo is not None:
+            memo.outputs = {}
+
+    def memoInfo(self):
+        '''Return statistics about the widget's memo: the number of renderings
+        it holds ("size"), the number of renderings that were found in it
+        ("hits") and that weren't ("misses"), and the "hitRate".
+
+        @rtype: dict
+        '''
+        memo = self.__dict__.get('_memo') or _Memo(self.revision)
+        calls = memo.hits + memo.misses
+        return {'size':len(memo.outputs), 'hits':memo.hits, 'misses':memo.misses,
+            'hitRate':calls and float(memo.hits) / calls or 0.0}
+
+    def renderCompact(self, name, value):
+        "Like calling the widget, but without any whitespace between elements that is only there for readability"
+        return self(name, value)
 
 class Input(Widget):
     "A callable that can be used to render html input elements of any type"
@@ -62,6 +160,7 @@ class Input(Widget):
 
 class Custom(Widget):
     "A callable that returns a custom html string, intended for the creation of simple custom widgets"
+    widgetType = 'custom'
 
     def __init__(self, content):
         self.content = content
@@ -71,12 +170,13 @@ class Custom(Widget):
 
 class CheckboxInput(Input):
     "A callable that renders html checkbox input elements"
+    widgetType = 'checkbox'
 
-#   This class overrides __call__ directly, instead of _render, because
+#   This class overrides _call directly, instead of _render, because
 #   checkbnox widgets should not have default value functionality... if the
 #   default value is true, it will be impossible for the user to submit it as
 #   unchecked
-    def __call__(self, name, value):
+    def _call(self, name, value):
         if value:
             attrString = self.renderAttributes(self.attrs, name=name, checked='checked')
         else:
@@ -86,17 +186,23 @@ class CheckboxInput(Input):
 
 class Textarea(Input):
     "A callable that renders html textarea elements"
+    widgetType = 'textarea'
     defaultAttrs = {'rows':'10', 'cols':'20'}
 
     def _render(self, name, value):
         attrString = self.renderAttributes(self.attrs, name=name)
-        return '<textarea %s>%s</textarea>' % (attrString, escape(str(value)))
+        return '<textarea %s>%s</textarea>' % (attrString, escape('%s' % (value,)))
 
 class RadioInput(Input):
     "A callable that renders html radio input elements... note that unlike most other widgets, one instance of this class renders multiple html elements.  However, as with all widgets, all of those elements are rendered as a single form field (i.e. all the radio elements are grouped under one label)."
+    widgetType = 'radio'
 
     defaultAttrs = {'type':'radio'}
 
+#   Translations of the option texts, i.e. {'Small':'Klein'}, for rendering
+#   them in another language (see forms.BaseForm.localizeField)
+    optionLabels = None
+
     def __init__(self, options=None, attrs=None, separator='\n'):
         if not options:
             raise Exception('No options passed in creation of radio widget')
@@ -104,24 +210,41 @@ class RadioInput(Input):
         self.separator = separator
         Input.__init__(self, attrs=attrs)
 
-    def _render(self, name, value):
+    def _render(self, name, value, separator=None):
         output = []
+        optionLabels = self.optionLabels or {}
         for choice in self.options:
             if value != choice: # if this input is not selected
                 output.append('<input %s>%s</input>' %
                 (self.renderAttributes(self.attrs, name=name, value=choice),
-                escape(choice)))
+                escape(optionLabels.get(choice, choice))))
             else: # if this input is selected
                 output.append('<input %s>%s</input>' %
-                (self.renderAttributes(self.attrs, checked="checked", name=name, value=choice), escape(value)))
-        return self.separator.join(output)
+                (self.renderAttributes(self.attrs, checked="checked", name=name, value=choice), escape(optionLabels.get(value, value))))
+        if separator is None:
+            separator = self.separator
+        return separator.join(output)
+
+    def renderCompact(self, name, value):
+        if self.memoSize:
+            return self._memoized('compact', self._callCompact, name, value)
+        return self._callCompact(name, value)
+
+    def _callCompact(self, name, value):
+        return self._render(name, self._value(value), '')
 
 class Select(Input):
     "A callable that renders an html select element, including its options."
+    widgetType = 'select'
+
+#   Translations of the option texts, as for RadioInput
+    optionLabels = None
 
     def __init__(self, options=None, attrs=None, separator='\n'):
 
-#       Options can be a dict or a list (or any iterable)... dicts are preferrred
+#       Options can be a dict or a list (or any iterable)... dicts are preferrred.
+#       They can also be an option catalog (see the formulaic.catalogs module),
+#       which renders them itself
         if not options:
             raise Exception('No options provided for select widget')
         self.options = options
@@ -141,20 +264,36 @@ class Select(Input):
             except: # just in case it isn't a list
                 return item == selection
 
-    def _render(self, name, value):
+    def _render(self, name, value, compact=False):
+        attrString = self.renderAttributes(self.attrs, name=name)
+        if hasattr(self.options, 'renderOptions'): # if options was a catalog
+            if compact:
+                return '<select %s>%s</select>' % (attrString, self.options.renderOptions(value, ''))
+            return '<select %s>\n%s\n</select>' % (attrString, self.options.renderOptions(value, self.separator))
+
         options = []
+        optionLabels = self.optionLabels or {}
         if hasattr(self.options, 'keys'): # if options was a dict
             for label, item_value in sorted(self.options.items()):
                 if self.__isSelected(item_value, value):
-                    options.append('<option selected="selected" value=%s>%s</option>' % (quoteattr(label), escape(item_value)))
+                    options.append('<option selected="selected" value=%s>%s</option>' % (quoteattr(label), escape(optionLabels.get(item_value, item_value))))
                 else:
-                    options.append('<option value=%s>%s</option>' % (quoteattr(label), escape(item_value)))
+                    options.append('<option value=%s>%s</option>' % (quoteattr(label), escape(optionLabels.get(item_value, item_value))))
         else: # if options was a list
             for item_value in self.options:
                 if self.__isSelected(item_value, value):
-                    options.append('<option selected="selected" value=%s>%s</option>' % (quoteattr(item_value), escape(item_value)))
+                    options.append('<option selected="selected" value=%s>%s</option>' % (quoteattr(item_value), escape(optionLabels.get(item_value, item_value))))
                 else:
-                    options.append('<option value=%s>%s</option>' % (quoteattr(item_value), escape(item_value)))
+                    options.append('<option value=%s>%s</option>' % (quoteattr(item_value), escape(optionLabels.get(item_value, item_value))))
+        if compact:
+            return '<select %s>%s</select>' % (attrString, ''.join(options))
         options = self.separator.join(options)
-        attrString = self.renderAttributes(self.attrs, name=name)
         return '<select %s>\n%s\n</select>' % (attrString, options)
+
+    def renderCompact(self, name, value):
+        if self.memoSize:
+            return self._memoized('compact', self._callCompact, name, value)
+        return self._callCompact(name, value)
+
+    def _callCompact(self, name, value):
+        return self._render(name, self._value(value), True)
@@ -0,0 +1,259 @@
+#!/usr/bin/python
+"""
+benchmarks - Measurements of the formulaic form generation toolkit
+Copyright (C) 2005 Greg Steffensen, greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+import sys
+
+__doc__ = '''Reference forms and measurements of formulaic's output and speed.
+
+Running this module (python -m formulaic.benchmarks) runs its doctests (which
+check the measurements) and prints the measurements themselves.'''
+
+def referenceForm(formClass=None, size=10):
+    '''Build a form with a representative mix of widgets and no validation.
+
+    @param formClass: the form class to instantiate (BaseForm by default)
+    @param size: how many times to repeat the mix of widgets
+    @type size: int
+    '''
+    import forms
+    import basicwidgets as widgets
+    if formClass is None:
+        formClass = forms.BaseForm
+
+    form = formClass()
+    for i in range(size):
+        form['name%d' % i] = widgets.TextInput(None, 'Name %d' % i)
+        form['color%d' % i] = widgets.Select(None, 'Color %d' % i,
+            options=['Red', 'Green', 'Blue', 'Yellow'])
+        form['size%d' % i] = widgets.RadioInput(None, 'Size %d' % i,
+            options=['Small', 'Medium', 'Large'])
+        form['notes%d' % i] = widgets.Textarea(None, 'Notes %d' % i)
+        form['agree%d' % i] = widgets.CheckboxInput(None, 'Agree %d' % i)
+        form['token%d' % i] = widgets.HiddenInput(None, None)
+    return form
+
+def referenceValues(size=10):
+    "Build a submission for a form made by L{referenceForm}"
+    values = {}
+    for i in range(size):
+        values['name%d' % i] = 'Name'
+        values['color%d' % i] = 'Green'
+        values['notes%d' % i] = 'First line\n    indented line\n'
+    return values
+
+def compactSavings(form, values=None, errors=None):
+    '''Measure the size of a form rendered normally and in compact mode.
+
+    Compact mode saves at least the separator and line breaks around every
+    field:
+
+    >>> form = benchmarks.referenceForm()
+    >>> normal, compact = benchmarks.compactSavings(form,
+    ...     benchmarks.referenceValues())
+    >>> normal - compact >= 4 * len(form)
+    True
+
+    Whitespace inside textarea values is kept:
+
+    >>> form.compact = True
+    >>> 'First line\\n    indented line' in form.render(benchmarks.referenceValues(), {})
+    True
+
+    @return: a (normal, compact) tuple of the sizes of the two renderings
+    @rtype: tuple
+    '''
+    values, errors = values or {}, errors or {}
+    wasCompact = form.compact
+    try:
+        form.compact = False
+        normal = form.renderBytes(values, errors)
+        form.compact = True
+        compact = form.renderBytes(values, errors)
+    finally:
+        form.compact = wasCompact
+    return len(normal), len(compact)
+
+def importCost(modules='formulaic.forms formulaic.basicwidgets', repeat=5):
+    '''Measure how long importing formulaic takes in a fresh interpreter, and
+    check that formencode isn't imported along with it.
+
+    >>> seconds, loaded = benchmarks.importCost()
+    >>> loaded
+    []
+
+    @param modules: the modules to import, separated by spaces
+    @type modules: str
+    @param repeat: how many fresh interpreters to time (the best time is kept)
+    @type repeat: int
+    @return: a (seconds, loaded) tuple: the time the imports took, and which of
+    the expensive optional modules (formencode, cgi) they loaded
+    @rtype: tuple
+    '''
+    import os
+    from subprocess import Popen, PIPE
+    script = '''
+import sys, time
+start = time.time()
+for name in sys.argv[1:]:
+    __import__(name)
+print time.time() - start
+print ' '.join([name for name in ('formencode', 'cgi') if name in sys.modules])
+'''
+    environment = os.environ.copy()
+    package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment['PYTHONPATH'] = os.pathsep.join([package] + filter(None,
+        [environment.get('PYTHONPATH')]))
+
+    times = []
+    for i in range(repeat):
+        process = Popen([sys.executable, '-c', script] + modules.split(),
+            stdout=PIPE, env=environment)
+        output = process.communicate()[0].splitlines()
+        times.append(float(output[0]))
+    return min(times), output[1].split()
+
+def renderManyCost(form=None, values=None, rows=100):
+    '''Time rendering a number of submissions with L{forms.BaseForm.render}
+    and with L{forms.BaseForm.renderMany}, after checking that they produce
+    exactly the same output, whichever rendering methods the form overrides.
+
+    >>> import forms
+    >>> class StarredForm(forms.BaseForm):
+    ...     def renderWidget(self, field, name, value):
+    ...         return '*' + forms.BaseForm.renderWidget(self, field, name, value)
+    >>> for formClass in (forms.BaseForm, forms.TableForm, forms.RequirementsForm, StarredForm):
+    ...     single, many = benchmarks.renderManyCost(benchmarks.referenceForm(formClass), rows=2)
+    >>> '*<input' in benchmarks.referenceForm(StarredForm).renderMany([({}, {})])[0]
+    True
+
+    @param form: the form to render (by default, a L{referenceForm})
+    @param values: the values to render it with (by default,
+    L{referenceValues})
+    @param rows: how many submissions to render
+    @type rows: int
+    @return: a (single, many) tuple of the seconds it took to render each
+    submission one at a time, and all of them together
+    @rtype: tuple
+    '''
+    from timeit import default_timer
+    if form is None:
+        form = referenceForm()
+    if values is None:
+        values = referenceValues()
+    submissions = [(values, {'name0':'Please enter a value'}), (values, {}), ({}, {})]
+    submissions = [submissions[i % len(submissions)] for i in xrange(rows)]
+
+    start = default_timer()
+    expected = [form.render(values, errors) for values, errors in submissions]
+    single = default_timer() - start
+    start = default_timer()
+    output = form.renderMany(submissions)
+    many = default_timer() - start
+    if output != expected:
+        raise ValueError('%s renders differently with renderMany' % form.__class__.__name__)
+    return single, many
+
+def templateBackends(backends=None, form=None, values=None, number=100):
+    '''Time template backends, both filling in the templates of the
+    formulaic form classes and rendering a whole form, after checking that
+    they produce exactly the same output.
+
+    >>> results = benchmarks.templateBackends(number=1)
+    >>> [name for name, substitution, rendering in results]
+    ['fragments', 'string.Template']
+
+    @param backends: the L{templates.TemplateBackend}s to compare (by default,
+    the ones included with formulaic)
+    @param form: the form to render (by default, a L{referenceForm})
+    @param values: the values to render it with (by default,
+    L{referenceValues})
+    @param number: how many times to repeat each measurement
+    @type number: int
+    @return: a (name, substitution, rendering) tuple for each backend: the
+    seconds it took to fill in each template of L{templates.templateSet} once,
+    and to render the form once
+    @rtype: list
+    '''
+    from timeit import default_timer
+    import templates
+    if backends is None:
+        backends = [templates.FragmentBackend(), templates.StringTemplateBackend()]
+    if form is None:
+        form = referenceForm()
+    if values is None:
+        values = referenceValues()
+    templateSet = templates.templateSet()
+    errors = {'name0':'Please enter a value'}
+
+    results = []
+    expected = None
+    wasBackend = form.__dict__.get('templateBackend')
+    try:
+        for backend in backends:
+            mismatches = templates.checkBackend(backend, templateSet)
+            if mismatches:
+                raise ValueError('backend %r fills in %r differently' % (backend.name, mismatches[0][0]))
+            form.templateBackend = backend
+            output = form.render(values, errors)
+            if expected is None:
+                expected = output
+            elif output != expected:
+                raise ValueError('backend %r renders the form differently' % backend.name)
+
+            compiled = [(backend.compile(source), params) for source, params in templateSet]
+            start = default_timer()
+            for i in xrange(number):
+                for template, params in compiled:
+                    template.substitute(**params)
+            substitution = (default_timer() - start) / number
+
+            start = default_timer()
+            for i in xrange(number):
+                form.render(values, errors)
+            rendering = (default_timer() - start) / number
+            results.append((backend.name, substitution, rendering))
+    finally:
+        if wasBackend is None:
+            del form.templateBackend
+        else:
+            form.templateBackend = wasBackend
+    return results
+
+def main():
+    import doctest
+    module = sys.modules[__name__]
+    doctest.testmod(module, extraglobs={'benchmarks':module})
+
+    normal, compact = compactSavings(referenceForm(), referenceValues())
+    print 'compact output: %d of %d bytes (%.1f%% saved)' % (compact, normal,
+        100.0 * (normal - compact) / normal)
+
+    seconds, loaded = importCost()
+    withFormencode = importCost('formencode.api formencode.schema formulaic.forms formulaic.basicwidgets')[0]
+    print 'importing formulaic: %.1f ms (%.1f ms with formencode)' % (seconds * 1000, withFormencode * 1000)
+
+    single, many = renderManyCost()
+    print 'renderMany: %.2f ms per row (%.2f ms with render)' % (many * 10, single * 10)
+
+    for name, substitution, rendering in templateBackends():
+        print 'template backend %s: %.1f us per template set, %.2f ms per form' % (name,
+            substitution * 1000000, rendering * 1000)
+
+if __name__ == '__main__':
+    main()
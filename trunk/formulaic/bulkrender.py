@@ -0,0 +1,246 @@
+#!/usr/bin/python
+"""
+bulkrender - Offline rendering of many filled-in forms for the formulaic form
+generation toolkit
+Copyright (C) 2005 Greg Steffensen, greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+import os
+from collections import deque
+from itertools import islice
+from timeit import default_timer
+
+from forms import LazyField
+
+__doc__ = '''Rendering a form filled in with many records into static files, with
+a pool of processes.
+
+Static pages (printable or offline versions of records, say) are often
+generated for hundreds of thousands of records at a time, which takes hours in
+one process.  L{render} spreads the work over a multiprocessing pool::
+
+    records = ((row.id, row.values()) for row in database.query(...))
+    stats = bulkrender.render(form, records, '/var/www/static/records',
+        filename='record-%s.html', progressPath='/var/tmp/records.progress')
+
+The form is prepared (its lazy fields built and its templates compiled) once,
+before the workers start, and handed to them once as they start; on platforms
+that fork, they inherit it without it ever being pickled.  The records are then
+sent to the workers in chunks, each worker renders its chunk and writes the
+files itself, and only the number of files and bytes written comes back.  No
+more than a few chunks per worker are in flight at any time, so records can be
+streamed from a database or a file of any size.
+
+Chunks are collected in the order they were sent, so the records that are done
+are always the first so many of them.  With a progress file, that number is
+saved after every chunk; if the run stops (or is stopped), calling L{render}
+again with the same records and progress file skips the records already
+written.  Since workers share nothing but the form, throughput grows nearly in
+proportion to the number of cores; L{main} measures it for the reference
+form::
+
+    python -m formulaic.bulkrender --records 20000 --processes 1,2,4,8'''
+
+#   The form and settings of a worker process, set by _startWorker when the
+#   worker starts
+_workerState = {}
+
+def _startWorker(form, directory, filename, encoding):
+    "Set up a worker process"
+    _workerState.update(form=form, directory=directory, filename=filename, encoding=encoding)
+
+def _writeFile(path, data):
+    "Write a file atomically, so that a partially written file is never left behind"
+    temporary = '%s.%d.tmp' % (path, os.getpid())
+    output = open(temporary, 'wb')
+    try:
+        output.write(data)
+    finally:
+        output.close()
+    os.rename(temporary, path)
+
+def _renderChunk(chunk):
+    "Render a chunk of records into their files, returning how many files and bytes were written"
+    state = _workerState
+    form, directory, filename, encoding = state['form'], state['directory'], state['filename'], state['encoding']
+    written = 0
+    for record in chunk:
+        errors = {}
+        if len(record) > 2:
+            errors = record[2] or {}
+        body = form.renderBytes(record[1], errors, encoding)
+        _writeFile(os.path.join(directory, filename % (record[0],)), body)
+        written += len(body)
+    return len(chunk), written
+
+def _chunks(records, chunkSize):
+    "Split an iterable of records into lists of chunkSize records"
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunkSize))
+        if not chunk:
+            return
+        yield chunk
+
+def prepare(form):
+    '''Build everything a form needs to render (its lazy fields and its
+    compiled templates), so that worker processes don't each have to.
+
+    @type form: L{forms.BaseForm}
+    '''
+    for name in form.iterkeys():
+        if isinstance(dict.__getitem__(form, name), LazyField):
+            form[name]
+    form.render({}, {})
+
+def readProgress(progressPath, form):
+    '''Return how many records a previous run with a progress file completed,
+    or 0 if there is no progress file.
+
+    @raise ValueError: if the progress file was written for a different
+    definition of the form (see L{forms.BaseForm.fingerprint}), whose files
+    shouldn't be mixed with this one's
+    @rtype: int
+    '''
+    if progressPath is None or not os.path.exists(progressPath):
+        return 0
+    input = open(progressPath, 'rb')
+    try:
+        fingerprint, completed = input.read().split()
+    finally:
+        input.close()
+    if fingerprint != form.fingerprint():
+        raise ValueError('%s was written for a different form; remove it to start over' % progressPath)
+    return int(completed)
+
+def writeProgress(progressPath, form, completed):
+    "Save how many records have been completed into a progress file"
+    _writeFile(progressPath, '%s %d\n' % (form.fingerprint(), completed))
+
+def render(form, records, directory, filename='%s.html', processes=None,
+    chunkSize=200, progressPath=None, encoding='utf-8'):
+    '''Render a form filled in with each of many records, into one file per
+    record.
+
+    @param form: the form to render
+    @type form: L{forms.BaseForm}
+    @param records: an iterable of (key, values) or (key, values, errors)
+    tuples, in the same order every time if the run is to be resumable
+    @param directory: the directory the files are written to
+    @type directory: str
+    @param filename: the name of each record's file, with "%s" standing for
+    the record's key (which must make a safe file name)
+    @type filename: str
+    @param processes: how many worker processes to render with (by default,
+    one per core); 1 renders in this process, without a pool
+    @type processes: int
+    @param chunkSize: how many records are sent to a worker at a time
+    @type chunkSize: int
+    @param progressPath: the file that progress is saved to, and resumed from
+    (see L{readProgress}), or None to always start from the first record
+    @type progressPath: str
+    @param encoding: the encoding of the files
+    @type encoding: str
+    @return: a dict of "records" (how many were rendered by this run),
+    "skipped" (how many were skipped, having been rendered by an earlier run),
+    "bytes" (how much was written), "seconds" and "throughput" (records per
+    second)
+    @rtype: dict
+    '''
+    if processes is None:
+        import multiprocessing
+        processes = multiprocessing.cpu_count()
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    prepare(form)
+
+    skipped = readProgress(progressPath, form)
+    if skipped:
+        records = islice(records, skipped, None)
+    completed, written = skipped, 0
+    start = default_timer()
+
+    if processes <= 1:
+        _startWorker(form, directory, filename, encoding)
+        try:
+            for chunk in _chunks(records, chunkSize):
+                count, size = _renderChunk(chunk)
+                completed, written = completed + count, written + size
+                if progressPath is not None:
+                    writeProgress(progressPath, form, completed)
+        finally:
+            _workerState.clear()
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(processes, _startWorker, (form, directory, filename, encoding))
+        try:
+#           chunks are collected in the order they were sent, and only a few
+#           per worker are sent ahead, so that records are streamed rather
+#           than all read up front
+            pending = deque()
+            chunks = _chunks(records, chunkSize)
+            while True:
+                while len(pending) < processes * 2:
+                    try:
+                        chunk = chunks.next()
+                    except StopIteration:
+                        break
+                    pending.append(pool.apply_async(_renderChunk, (chunk,)))
+                if not pending:
+                    break
+                count, size = pending.popleft().get()
+                completed, written = completed + count, written + size
+                if progressPath is not None:
+                    writeProgress(progressPath, form, completed)
+        finally:
+#           every chunk has been collected unless something failed, in which
+#           case the rest of the work is abandoned
+            pool.terminate()
+            pool.join()
+
+    seconds = default_timer() - start
+    return {'records':completed - skipped, 'skipped':skipped, 'bytes':written,
+        'seconds':seconds, 'throughput':(completed - skipped) / (seconds or 1e-9)}
+
+def main(arguments=None):
+    from optparse import OptionParser
+    import shutil
+    import tempfile
+    from benchmarks import referenceForm, referenceValues
+
+    parser = OptionParser(usage='%prog [options]', description='Measure how bulk rendering of the reference form scales with processes.')
+    parser.add_option('-n', '--records', type='int', default=20000, help='number of records to render [%default]')
+    parser.add_option('-p', '--processes', default='1,2,4', help='comma-separated numbers of processes to try [%default]')
+    parser.add_option('--chunk-size', type='int', default=200, help='records sent to a worker at a time [%default]')
+    parser.add_option('--size', type='int', default=10, help='size of the reference form [%default]')
+    options, arguments = parser.parse_args(arguments)
+
+    form, values = referenceForm(size=options.size), referenceValues(options.size)
+    baseline = None
+    for processes in [int(number) for number in options.processes.split(',')]:
+        directory = tempfile.mkdtemp(prefix='formulaic-bulkrender-')
+        try:
+            records = ((number, values) for number in xrange(options.records))
+            stats = render(form, records, directory, processes=processes, chunkSize=options.chunk_size)
+        finally:
+            shutil.rmtree(directory, True)
+        if baseline is None:
+            baseline = stats['throughput'] / processes
+        print '%d processes: %d records in %.2f s, %.1f records/s (%.2fx one process)' % (processes,
+            stats['records'], stats['seconds'], stats['throughput'], stats['throughput'] / baseline)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/python
+"""
+catalogs - Memory-mapped option lists for the formulaic form generation
+toolkit
+Copyright (C) 2005 Greg Steffensen, greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+import mmap
+import os
+import cPickle as pickle
+try:
+    from hashlib import md5
+except ImportError: # python 2.4
+    from md5 import new as md5
+from basicwidgets.escaping import quoteattr, escape
+
+__doc__ = '''Option lists for select widgets, kept in memory-mapped files.
+
+A select widget with thousands of options (countries, products, ...) holds
+them all in every process that uses it, and escapes them all again every time
+it is rendered.  An L{OptionCatalog} instead keeps the already escaped
+I{<option/>} elements in a file that is mapped into memory, so that all the
+processes using the catalog share one copy of it (the operating system's), and
+rendering the options is mostly a matter of slicing that memory::
+
+    catalogs.OptionCatalog.build('/var/lib/app/countries', countryNames)
+    ...
+    countries = catalogs.OptionCatalog('/var/lib/app/countries')
+    form['country'] = widgets.Select(None, 'Country', options=countries)
+
+Catalogs are built from the same lists and dicts that select widgets accept,
+and render exactly the same markup.  A catalog stores its options in the
+encoding it was built with, and decodes them as they are rendered, so that they
+mix with the rest of the form like any other text (and are encoded again by
+L{forms.BaseForm.renderBytes} in whatever encoding it is asked for).  Catalogs
+whose options are all ASCII need no decoding, and are rendered straight from the
+mapped file.'''
+
+class OptionCatalog(object):
+    '''A read-only, memory-mapped list of pre-escaped select options.
+
+    Opening a catalog maps its data file and loads its (small) index; do this
+    before forking, so that the index is shared too.
+
+    @ivar path: the path of the catalog's data file (its index is stored
+    alongside, with ".index" appended to the name)
+    @ivar separator: the string the options are separated by in the file
+    @ivar encoding: the encoding of the file, or None for catalogs built before
+    it was recorded (whose options are rendered as byte strings)
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        indexFile = open(path + '.index', 'rb')
+        try:
+            index = pickle.load(indexFile)
+        finally:
+            indexFile.close()
+        if len(index) == 2: # an index written before encodings were recorded
+            (self.separator, entries), self.encoding, self._ascii = index, None, True
+        else:
+            self.separator, entries, self.encoding, self._ascii = index
+
+        self._digest = None
+        self._index = {}
+        for key, start, end in entries:
+            self._index.setdefault(key, []).append((start, end))
+
+        dataFile = open(path, 'rb')
+        try:
+            self._size = os.fstat(dataFile.fileno()).st_size
+            if self._size:
+                self._data = mmap.mmap(dataFile.fileno(), 0, access=mmap.ACCESS_READ)
+            else: # empty files can't be mapped
+                self._data = ''
+        finally:
+            dataFile.close()
+
+    @staticmethod
+    def build(path, options, separator='\n', encoding='utf-8'):
+        '''Write a catalog to disk and return it, opened.
+
+        @param path: the path of the data file to write
+        @type path: str
+        @param options: the options, as a list (or any iterable) or a dict,
+        exactly as for select widgets
+        @param separator: the string to separate options with
+        @type separator: str
+        @param encoding: the encoding to store unicode options in
+        @type encoding: str
+        @rtype: L{OptionCatalog}
+        '''
+        if hasattr(options, 'keys'): # if options was a dict
+            items = [(label, item_value) for label, item_value in sorted(options.items())]
+        else: # if options was a list
+            items = [(item_value, item_value) for item_value in options]
+
+        ascii = _isAscii(separator) and u'<>'.encode(encoding) == '<>'
+        separator = _encode(separator, encoding)
+        entries = []
+        position = 0
+        dataFile = open(path, 'wb')
+        try:
+            for i, (label, item_value) in enumerate(items):
+                if i:
+                    dataFile.write(separator)
+                    position += len(separator)
+                fragment = '<option value=%s>%s</option>' % (quoteattr(label), escape(item_value))
+                ascii = ascii and _isAscii(fragment)
+                fragment = _encode(fragment, encoding)
+                dataFile.write(fragment)
+                entries.append((item_value, position, position + len(fragment)))
+                position += len(fragment)
+        finally:
+            dataFile.close()
+
+        indexFile = open(path + '.index', 'wb')
+        try:
+            pickle.dump((separator, entries, encoding, ascii), indexFile, pickle.HIGHEST_PROTOCOL)
+        finally:
+            indexFile.close()
+        return OptionCatalog(path)
+
+    def digest(self):
+        '''Return a digest of the catalog's markup, worked out the first time
+        it is asked for.  Catalogs with the same digest render the same
+        options, wherever their files are.
+
+        @rtype: str
+        '''
+        if self._digest is None:
+            digest = md5('%s\0%s' % (self.encoding, self.separator))
+            for start in xrange(0, self._size, 1 << 20):
+                digest.update(self._data[start:start + (1 << 20)])
+            self._digest = digest.hexdigest()
+        return self._digest
+
+    def __len__(self):
+        return sum([len(positions) for positions in self._index.values()])
+
+    def _selected(self, selection):
+        "Return the positions of the options that a selection selects, in order"
+        if selection is None:
+            return []
+        elif isinstance(selection, basestring):
+            selection = [selection]
+        else:
+            try:
+                selection = list(selection)
+            except TypeError: # just in case it isn't a list
+                selection = [selection]
+
+        positions = []
+        for item in selection:
+            try:
+                positions.extend(self._index[item])
+            except (KeyError, TypeError):
+                pass
+        positions = list(set(positions))
+        positions.sort()
+        return positions
+
+    def renderOptions(self, selection, separator=None):
+        '''Render the options, with the ones matching the selection selected.
+
+        @param selection: the selected value, or a list of selected values
+        @param separator: the string to separate the options with.  Options
+        are sliced straight out of the mapped file when this is the separator
+        the catalog was built with (the default).
+        @return: the rendered options, as unicode unless they are all ASCII
+        @rtype: unicode
+        '''
+        if separator is not None and separator != self.separator:
+            return separator.join([self._decode(option) for option in self._renderOptions(selection)])
+
+        output = []
+        position = 0
+        for start, end in self._selected(selection):
+            output.append(self._data[position:start])
+#           '<option ' is 8 characters long
+            output.append('%sselected="selected" %s' % (self._data[start:start + 8], self._data[start + 8:end]))
+            position = end
+        output.append(self._data[position:self._size])
+        return self._decode(''.join(output))
+
+    def _decode(self, data):
+        "Decode rendered options from the catalog's encoding"
+        if self._ascii:
+            return data
+        return data.decode(self.encoding)
+
+    def _renderOptions(self, selection):
+        "Return the rendered options as a list, for joining with other separators"
+        selected = set(self._selected(selection))
+        starts = []
+        for positions in self._index.values():
+            starts.extend(positions)
+        starts.sort()
+
+        output = []
+        for start, end in starts:
+            if (start, end) in selected:
+                output.append('%sselected="selected" %s' % (self._data[start:start + 8], self._data[start + 8:end]))
+            else:
+                output.append(self._data[start:end])
+        return output
+
+def _isAscii(text):
+    "Determine whether a string (or unicode string) is plain ASCII"
+    try:
+        if isinstance(text, unicode):
+            text.encode('ascii')
+        else:
+            text.decode('ascii')
+    except UnicodeError:
+        return False
+    return True
+
+def _encode(text, encoding):
+    if isinstance(text, unicode):
+        return text.encode(encoding)
+    return text
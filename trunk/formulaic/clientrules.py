@@ -0,0 +1,236 @@
+#!/usr/bin/python
+"""
+clientrules - Client-side validation rules for the formulaic form generation
+toolkit
+Copyright (C) 2005 Greg Steffensen, greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+from formencode import validators, compound
+
+__doc__ = '''Export of the simple checks of a form's validators, so that browsers
+can run them before the form is submitted.
+
+Most failed submissions fail on trivial checks (a required field left empty, a
+value that is too long), and each of them costs a full round trip to the
+server.  L{rules} walks the validators of a form's fields and translates the
+ones that a browser can check exactly into a rules document::
+
+    {'fields': {'age': {'required': True, 'integer': True, 'min': 18}},
+     'unsupported': [{'field': 'email', 'validator': 'Email'}]}
+
+Every rule is a necessary condition of the server accepting the value, so
+checking it in the browser never rejects a value that the server would accept.
+As with formencode, all of the rules except "required" only apply to non-empty
+values.  The rules are:
+
+    - "required": the value must not be empty
+    - "maxLength", "minLength": bounds on the length of the value
+    - "integer": the value must be a whole number
+    - "min", "max": bounds on the (numeric) value
+    - "oneOf": the list of values the value must be one of
+    - "inOptions": the value must be one of the field's own options (used
+      instead of "oneOf" when the two lists are the same, which saves sending
+      the options twice)
+
+Validators that can't be expressed are listed under "unsupported", with the
+name of their field (None for validators of the whole form); the server still
+runs them, of course.  Only the validator classes in L{RULES} are supported,
+and subclasses of them aren't, since they may check more than their bases do;
+add entries to L{RULES} to support your own classes.
+
+L{annotate} also writes the rules into the html attributes of the widgets (as
+I{data-required}, I{data-maxlength} and so on), for scripts that read the rules
+from the markup instead.'''
+
+def _required(validator, fieldRules, renderer):
+    fieldRules['required'] = True
+    return True
+
+def _maxLength(validator, fieldRules, renderer):
+#   a value that the validator strips could be too long in the browser, but not
+#   on the server
+    if validator.strip:
+        return False
+    fieldRules['maxLength'] = min(validator.maxLength, fieldRules.get('maxLength', validator.maxLength))
+    return True
+
+def _minLength(validator, fieldRules, renderer):
+    fieldRules['minLength'] = max(validator.minLength, fieldRules.get('minLength', validator.minLength))
+    return True
+
+def _integer(validator, fieldRules, renderer):
+    fieldRules['integer'] = True
+    if validator.min is not None:
+        fieldRules['min'] = max(validator.min, fieldRules.get('min', validator.min))
+    if validator.max is not None:
+        fieldRules['max'] = min(validator.max, fieldRules.get('max', validator.max))
+    return True
+
+def _optionValues(renderer):
+    "Return the values a widget's options submit, or None if it has no options"
+    options = getattr(renderer, 'options', None)
+    if options is None or hasattr(options, 'renderOptions'): # catalogs can't be listed cheaply
+        return None
+    elif hasattr(options, 'keys'): # if options was a dict
+        return options.keys()
+    return list(options)
+
+def _oneOf(validator, fieldRules, renderer):
+    allowed = list(validator.list or [])
+#   the browser only ever submits strings, which the server compares as they are
+    for item in allowed:
+        if not isinstance(item, basestring):
+            return False
+    if 'oneOf' in fieldRules:
+        allowed = [item for item in fieldRules['oneOf'] if item in allowed]
+    elif fieldRules.get('inOptions'):
+        allowed = [item for item in _optionValues(renderer) if item in allowed]
+
+    options = _optionValues(renderer)
+    fieldRules.pop('oneOf', None)
+    fieldRules.pop('inOptions', None)
+    if options is not None and set(options) == set(allowed):
+        fieldRules['inOptions'] = True
+    else:
+        fieldRules['oneOf'] = allowed
+    return True
+
+#   The validator classes that can be expressed as client-side rules, and the
+#   functions that do so.  Each function takes the validator, the rules of its
+#   field so far (a dict to add to) and the field's widget, and returns whether
+#   it could express the validator.
+RULES = {
+    validators.NotEmpty: _required,
+    validators.MaxLength: _maxLength,
+    validators.MinLength: _minLength,
+    validators.Int: _integer,
+    validators.OneOf: _oneOf,
+}
+
+def _walk(validator, fieldRules, renderer, unsupported):
+    "Add a validator's rules to a field's, and the names of what can't be expressed to unsupported"
+    if getattr(validator, 'not_empty', False):
+        fieldRules['required'] = True
+
+    if type(validator) is compound.All:
+        for inner in validator.validators:
+            _walk(inner, fieldRules, renderer, unsupported)
+        return
+
+    translate = RULES.get(type(validator))
+    if translate is None or not translate(validator, fieldRules, renderer):
+        unsupported.append(type(validator).__name__)
+
+def fieldRules(field):
+    '''Return the client-side rules of a field, and the names of the validator
+    classes of the field that couldn't be expressed.
+
+    @param field: a field, i.e. a validator with a renderer
+    @return: a (rules, unsupported) tuple of a dict and a list
+    @rtype: tuple
+    '''
+    from basicwidgets.inert import InertValidator
+    fieldRules, unsupported = {}, []
+    if not isinstance(field, InertValidator):
+        _walk(field, fieldRules, field.renderer, unsupported)
+    return fieldRules, unsupported
+
+def _buildRules(form):
+    fields, unsupported = {}, []
+    for name in form.iterkeys():
+        rules, names = fieldRules(form[name])
+        if rules:
+            fields[name] = rules
+        for validatorName in names:
+            unsupported.append({'field':name, 'validator':validatorName})
+
+    for validator in form.schema.pre_validators + form.schema.chained_validators:
+        unsupported.append({'field':None, 'validator':type(validator).__name__})
+    return {'fields':fields, 'unsupported':unsupported}
+
+def rules(form):
+    '''Return the client-side validation rules of a form, as a dict of plain
+    dicts, lists and strings that can be serialized with json.dumps.
+
+    The rules are worked out once per version of the form's definition (see
+    L{forms.BaseForm.derived}) and shared, so don't modify them.  Working them
+    out materializes the form's lazy fields, since the browser may need the
+    rules of any of them.
+
+    >>> from formencode import validators
+    >>> from formulaic import forms, basicwidgets as widgets
+    >>> form = forms.BaseForm()
+    >>> form['age'] = widgets.TextInput(validators.Int(min=18, not_empty=True), 'Age')
+    >>> form['email'] = widgets.TextInput(validators.Email(), 'Email')
+    >>> document = clientrules.rules(form)
+    >>> sorted(document['fields']['age'].items())
+    [('integer', True), ('min', 18), ('required', True)]
+    >>> document['unsupported']
+    [{'field': 'email', 'validator': 'Email'}]
+
+    @type form: L{forms.BaseForm}
+    @rtype: dict
+    '''
+    return form.derived('clientRules', lambda: _buildRules(form))
+
+#   The html attributes that rules are written to by annotate, and whether
+#   their values are lists (written as JSON)
+DATA_ATTRIBUTES = {
+    'required': 'data-required',
+    'maxLength': 'data-maxlength',
+    'minLength': 'data-minlength',
+    'integer': 'data-integer',
+    'min': 'data-min',
+    'max': 'data-max',
+    'oneOf': 'data-one-of',
+    'inOptions': 'data-in-options',
+}
+
+def _dumps(value):
+    try:
+        import json
+    except ImportError: # python 2.5
+        import simplejson as json
+    return json.dumps(value)
+
+def annotate(form):
+    '''Write the client-side rules of a form's fields into the html attributes
+    of their widgets, replacing any written before.  Flags are written as
+    I{data-required="true"}, numbers as they are, and the "oneOf" list as
+    JSON.  Widgets without html attributes (i.e. custom widgets) are left
+    alone.
+
+    Call this again after changing the form's validators.
+
+    @type form: L{forms.BaseForm}
+    @return: the rules written (see L{rules})
+    @rtype: dict
+    '''
+    document = rules(form)
+    for name in form.iterkeys():
+        attrs = getattr(form[name].renderer, 'attrs', None)
+        if attrs is None:
+            continue
+        for attribute in DATA_ATTRIBUTES.values():
+            attrs.pop(attribute, None)
+        for rule, value in document['fields'].get(name, {}).items():
+            if value is True:
+                value = 'true'
+            elif isinstance(value, list):
+                value = _dumps(value)
+            attrs[DATA_ATTRIBUTES[rule]] = value
+    form.touch()
+    return document
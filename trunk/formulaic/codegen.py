@@ -0,0 +1,216 @@
+#!/usr/bin/python
+"""
+codegen - Specialized render functions for the formulaic form generation
+toolkit
+Copyright (C) 2005 Greg Steffensen, greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+import os
+try:
+    from hashlib import md5
+except ImportError: # python 2.4
+    from md5 import new as md5
+
+from forms import BaseForm, LazyField
+from values import adaptValues
+
+__doc__ = '''Generation of python render functions specialized to one form.
+
+A form's render method works everything out again on every call: which
+template each field uses, what its label looks like, whether the form needs
+multipart encoding and so on.  For a form whose definition doesn't change, all
+of that can be decided once.  L{specialize} writes the source code of a render
+function in which the form's templates, labels and footer are inlined as
+string literals, and the only work left for each field is calling its widget
+and filling in its error message.  The function is compiled with compile(), and
+behaves exactly like the form's render method::
+
+    render = codegen.specialize(form, cacheDirectory='/var/cache/forms')
+    html = render(values, errors)
+
+The generated source can be cached on disk, in files named after a hash of the
+form's definition, so that processes that build the same form skip the
+generation step.  A specialized function does not notice later changes to the
+form's definition; call L{specialize} again after changing the form.
+
+The label, template and error message of each field are worked out through the
+form's I{renderLabel}, I{fieldTemplate} and I{renderError} methods, so
+subclasses that customize those work as expected.  Fields of forms that
+override I{renderField} or I{renderWidget} themselves, and L{LazyField}
+placeholders, are rendered through the form's own renderField method.  Only
+forms whose template backend compiles templates into fragments (see the
+L{templates} module) can be specialized.'''
+
+GENERATOR_VERSION = 1
+
+def _overrides(form, name):
+    "Return whether the class of a form overrides one of BaseForm's methods"
+    return getattr(form.__class__, name).im_func is not getattr(BaseForm, name).im_func
+
+def describe(form):
+    '''Return a description of everything that a specialized render function
+    for a form inlines.  Two forms with equal descriptions can share the same
+    generated source.
+
+    @rtype: list
+    '''
+    if not hasattr(form.compileTemplate(form.formTpl), 'statics'):
+        raise TypeError('only forms whose template backend splits templates into fragments can be specialized')
+    generic = _overrides(form, 'renderField') or _overrides(form, 'renderWidget')
+    if form.compact:
+        separator = form.compactFieldSeparator
+    else:
+        separator = form.fieldSeparator
+
+    description = [GENERATOR_VERSION, form.__class__.__module__,
+        form.__class__.__name__, form.compileTemplate(form.formTpl).source,
+        separator, form.renderFooter(), generic,
+        _overrides(form, 'renderError') or form.compileTemplate(form.errorTpl).format]
+    for name in form.iterkeys():
+        field = dict.__getitem__(form, name)
+        if isinstance(field, LazyField):
+            description.append((name, 'lazy'))
+        elif generic or getattr(field.renderer, 'nested', False):
+            description.append((name, 'generic',
+                bool(getattr(field.renderer, 'needsMultipart', False))))
+        else:
+            description.append((name, form.fieldFormat(field),
+                bool(getattr(field.renderer, 'needsMultipart', False))))
+    return description
+
+def definitionKey(form):
+    "Return the hash of a form's definition that generated source is cached under"
+    return md5(repr(describe(form))).hexdigest()
+
+def generateSource(form):
+    '''Generate the source code of a render function specialized to a form.
+
+    The source defines a function called "render", taking the same arguments
+    as the form's render method.  It expects to be executed in a namespace set
+    up by L{specialize}.
+
+    @rtype: str
+    '''
+    description = describe(form)
+    separator, footer, generic, errorFormat = description[4:8]
+    template = form.compileTemplate(form.formTpl)
+
+    lines = ['def render(values, errors):',
+        '    values = adaptValues(values)',
+        '    get, eget = values.get, errors.get',
+        '    fields = []',
+        '    append = fields.append']
+
+    for i, (name, field) in enumerate(zip(form.iterkeys(), description[8:])):
+        lines.append('    # %r' % (name,))
+        if field[1] == 'lazy':
+            lines.append('    if L%d.isVisible(values):' % i)
+            lines.append("        if getattr(L%d.materialize().renderer, 'needsMultipart', False):" % i)
+            lines.append("            form.attrs['enctype'] = 'multipart/form-data'")
+            lines.append('        append(form.renderField(%r, get(%r), eget(%r)))' % (name, name, name))
+            continue
+
+        if field[2]:
+            lines.append("    form.attrs['enctype'] = 'multipart/form-data'")
+        if field[1] == 'generic':
+            lines.append('    append(form.renderField(%r, get(%r), eget(%r)))' % (name, name, name))
+            continue
+
+        format, params = field[1]
+        args = []
+        for param in params:
+            if param == 'widget':
+                args.append('W%d(%r, get(%r))' % (i, name, name))
+            elif errorFormat is True: # renderError is overridden
+                args.append('form.renderError(eget(%r))' % name)
+            else:
+                args.append("(eget(%r) and %r %% {'error': eget(%r)} or '')" % (name, errorFormat, name))
+        if args:
+            lines.append('    append((%r %% (%s,)).strip())' % (format, ', '.join(args)))
+        else:
+            lines.append('    append(%r)' % format.replace('%%', '%').strip())
+
+    output = []
+    for static, param in zip(template.statics, template.names):
+        if static:
+            output.append(repr(static))
+        if param == 'fields':
+            output.append('%r.join(fields)' % separator)
+        elif param == 'footer':
+            output.append(repr(footer))
+        elif param == 'formAttributes':
+            output.append('form.renderAttributes(form.attrs)')
+        else:
+            raise KeyError(param)
+    if template.statics[-1]:
+        output.append(repr(template.statics[-1]))
+    lines.append("    return ''.join([%s])" % ', '.join(output))
+    return '\n'.join(lines) + '\n'
+
+def _namespace(form):
+    "Build the namespace that generated source for a form is executed in"
+    namespace = {'adaptValues':adaptValues, 'form':form}
+    for i, name in enumerate(form.iterkeys()):
+        field = dict.__getitem__(form, name)
+        if isinstance(field, LazyField):
+            namespace['L%d' % i] = field
+        elif form.compact and getattr(field.renderer, 'renderCompact', None) is not None:
+            namespace['W%d' % i] = field.renderer.renderCompact
+        else:
+            namespace['W%d' % i] = field.renderer
+    return namespace
+
+def specialize(form, cacheDirectory=None):
+    '''Return a render function specialized to a form.
+
+    @param form: the form to specialize the function to
+    @type form: L{forms.BaseForm}
+    @param cacheDirectory: a directory in which to cache the generated source,
+    or None to not cache it.  The directory is created if it doesn't exist.
+    @type cacheDirectory: str
+    @return: a function taking the same arguments as the form's render method.
+    The function's "key" attribute is the hash of the form's definition, and
+    its "source" attribute is its source code.
+    '''
+    key = definitionKey(form)
+    source = None
+    if cacheDirectory is not None:
+        path = os.path.join(cacheDirectory, 'form_%s.py' % key)
+        try:
+            source = open(path).read()
+        except IOError:
+            pass
+
+    if source is None:
+        source = generateSource(form)
+        if cacheDirectory is not None:
+            if not os.path.isdir(cacheDirectory):
+                os.makedirs(cacheDirectory)
+#           write to a temporary file first, so that other processes never read
+#           a partially written file
+            temporary = '%s.%d.tmp' % (path, os.getpid())
+            output = open(temporary, 'w')
+            try:
+                output.write(source)
+            finally:
+                output.close()
+            os.rename(temporary, path)
+
+    namespace = _namespace(form)
+    exec compile(source, '<formulaic specialized render %s>' % key, 'exec') in namespace
+    render = namespace['render']
+    render.key, render.source = key, source
+    return render
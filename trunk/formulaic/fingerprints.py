@@ -0,0 +1,238 @@
+#!/usr/bin/python
+"""
+fingerprints - Fingerprints of form definitions for the formulaic form
+generation toolkit
+Copyright (C) 2005 Greg Steffensen, greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+try:
+    from hashlib import md5
+except ImportError: # python 2.4
+    from md5 import new as md5
+from string import Template
+import types
+
+from forms import LazyField, RENDER_SETTINGS
+from values import adaptValues
+
+__doc__ = '''Fingerprints of form definitions, for HTTP entity tags.
+
+A form viewed for the first time renders identically for every user, and a
+form redisplayed with errors renders identically for everyone who submitted the
+same values.  The fingerprint of a form (see L{forms.BaseForm.fingerprint}) is
+a digest of everything its rendering depends on besides the values and errors;
+combined with a digest of those, it makes an entity tag that can be compared
+with a request's I{If-None-Match} header before anything is rendered (see
+L{forms.BaseForm.renderIfNoneMatch}).
+
+Fingerprints only depend on the definition of the form, never on object
+identities or memory addresses, so every process that builds the same form
+computes the same fingerprint, and entity tags stay valid across the workers
+of a server.  Forms digest each field once, and digest it again only after its
+widget changes, so keeping the fingerprint of a form up to date costs little
+even when the form changes often.  Option catalogs are identified by a digest
+of their markup (see L{catalogs.OptionCatalog.digest}), and functions (such as
+the visibility predicates of lazy fields) by their code, constants and closures.
+
+Fingerprinting a form builds its L{LazyField}s (without rendering them), so
+that a form has the same fingerprint whether or not its lazy fields have been
+used yet.'''
+
+#   The templates and settings of a form that its rendering depends on (its
+#   template backend is digested by class, and its translator only matters to
+#   renderings in a locale; see submissionDigest)
+FORM_SETTINGS = tuple([setting for setting in RENDER_SETTINGS
+    if setting not in ('templateBackend', 'translator')])
+
+def stableRepr(value, depth=0):
+    '''Return a representation of a value that doesn't depend on object
+    identities, or on the order of dicts.
+
+    >>> fingerprints.stableRepr({'b':[1, 'x'], 'a':None})
+    "{'a':None,'b':[1,'x']}"
+
+    @rtype: str
+    '''
+    if value is None or isinstance(value, (basestring, bool, int, long, float)):
+        return repr(value)
+    elif depth > 8: # give up on deeply nested (or cyclic) structures
+        return '...'
+    elif hasattr(value, 'fingerprint'): # an embedded form
+        return 'Form(%s)' % value.fingerprint()
+    elif isinstance(value, (list, tuple)):
+        return '[%s]' % ','.join([stableRepr(item, depth + 1) for item in value])
+    elif hasattr(value, 'keys') and hasattr(value, 'items'):
+        items = sorted(value.items())
+        return '{%s}' % ','.join(['%s:%s' % (stableRepr(key, depth + 1), stableRepr(item, depth + 1)) for key, item in items])
+    elif isinstance(value, Template):
+        return 'Template(%r)' % (value.template,)
+    elif hasattr(value, 'renderOptions'): # an option catalog
+        if hasattr(value, 'digest'):
+            return 'OptionCatalog(%s)' % value.digest()
+        return 'OptionCatalog(%r,%d)' % (getattr(value, 'path', None), len(value))
+    elif isinstance(value, types.FunctionType):
+        return _functionRepr(value, depth)
+    elif isinstance(value, types.MethodType):
+        return '%s.%s' % (value.im_class.__name__, _functionRepr(value.im_func, depth))
+    elif isinstance(value, types.CodeType):
+        return 'code(%s,%s,%s)' % (md5(value.co_code).hexdigest(),
+            stableRepr(value.co_names, depth + 1), stableRepr(value.co_consts, depth + 1))
+    elif isinstance(value, types.BuiltinFunctionType):
+        return '%s.%s' % (getattr(value, '__module__', None), value.__name__)
+    elif hasattr(value, '__dict__'):
+        public = dict([(key, item) for key, item in value.__dict__.items() if not key.startswith('_')])
+        return '%s.%s%s' % (value.__class__.__module__, value.__class__.__name__, stableRepr(public, depth + 1))
+    return '%s.%s' % (value.__class__.__module__, value.__class__.__name__)
+
+def _functionRepr(function, depth):
+    "Represent a function by what it does: its code, defaults and closure"
+    closure = []
+    for cell in function.func_closure or ():
+        try:
+            contents = cell.cell_contents
+        except ValueError: # an empty cell
+            contents = None
+#       a function can refer to the form being fingerprinted
+        if hasattr(contents, 'fingerprint'):
+            contents = contents.__class__.__name__
+        closure.append(contents)
+    return 'function(%s.%s,%s,%s,%s)' % (function.__module__, function.__name__,
+        stableRepr(function.func_code, depth + 1), stableRepr(function.func_defaults, depth + 1),
+        stableRepr(closure, depth + 1))
+
+def fieldDigest(form, name, field):
+    '''Return the digest of one field of a form.
+
+    @type form: L{forms.BaseForm}
+    @param name: the name of the field
+    @param field: the field, or the L{LazyField} placeholder of a field (which
+    is built, if it hasn't been yet)
+    @rtype: str
+    '''
+    visible = ''
+    if isinstance(field, LazyField):
+        visible = stableRepr(field.visible)
+        field = field.materialize()
+
+    renderer = field.renderer
+    attributes = dict([(key, item) for key, item in renderer.__dict__.items()
+        if key != 'revision' and not key.startswith('_')])
+    parts = [repr(name), renderer.__class__.__module__, renderer.__class__.__name__,
+        stableRepr(attributes), repr(bool(form.isRequired(field))), visible]
+    return md5('\0'.join(parts)).hexdigest()
+
+def _cachedFieldDigest(form, name, field):
+    "Return the digest of a field, digesting it again only if its widget changed"
+    placeholder = field
+    if isinstance(field, LazyField):
+        field = field.materialize()
+    revision = getattr(field.renderer, 'revision', None)
+    nested = getattr(field.renderer, 'form', None)
+    if hasattr(nested, 'fingerprint'): # changes to embedded forms don't change the widget
+        revision = (revision, nested.fingerprint())
+
+    entry = form._fieldDigests.get(name)
+    if entry is not None and entry[0] is placeholder and entry[1] is field and entry[2] == revision:
+        return entry[3]
+    digest = fieldDigest(form, name, placeholder)
+    form._fieldDigests[name] = (placeholder, field, revision, digest)
+    return digest
+
+def formFingerprint(form):
+    '''Work out the fingerprint of a form.  Use the form's own fingerprint
+    method instead, which remembers it.
+
+    @type form: L{forms.BaseForm}
+    @rtype: str
+    '''
+    digests = []
+    multipart = False
+    for name in form.iterkeys():
+        field = dict.__getitem__(form, name)
+        digests.append(_cachedFieldDigest(form, name, field))
+        if isinstance(field, LazyField):
+            field = field.field
+        if getattr(field.renderer, 'needsMultipart', False):
+            multipart = True
+#   forget the fields that have been removed
+    if len(form._fieldDigests) > len(digests):
+        for name in form._fieldDigests.keys():
+            if name not in form:
+                del form._fieldDigests[name]
+
+#   rendering forms with file fields adds the encoding to their attributes,
+#   which mustn't change their fingerprint
+    attrs = dict(form.attrs)
+    if multipart and attrs.get('enctype') == 'multipart/form-data':
+        del attrs['enctype']
+
+    settings = [stableRepr(getattr(form, setting, None)) for setting in FORM_SETTINGS]
+    backend = form.templateBackend
+    parts = [form.__class__.__module__, form.__class__.__name__, stableRepr(attrs),
+        stableRepr(form.submitLabel), '%s.%s' % (backend.__class__.__module__,
+        backend.__class__.__name__)] + settings + digests
+    return md5('\0'.join(parts)).hexdigest()
+
+def submissionDigest(form, values, errors, locale=None, encoding=None):
+    '''Return a digest of the values and errors that a form is rendered with,
+    as far as the form's fields are concerned, and of the locale it is
+    rendered in and the encoding it is encoded with.
+
+    @rtype: str
+    '''
+    values, errors = adaptValues(values), errors or {}
+    if form.hasLazyFields(): # visibility predicates can look at any value
+        names = sorted(values.keys())
+    else:
+        names = form.iterkeys()
+    submitted = []
+    for name in names:
+        if name in values:
+            submitted.append((name, values.get(name)))
+    reported = []
+    for name, error in errors.items():
+        if error:
+            reported.append((name, '%s' % (error,)))
+    parts = [stableRepr(submitted), stableRepr(sorted(reported))]
+    if locale is not None:
+        parts.append(stableRepr(locale))
+        parts.append(stableRepr(form.translator))
+    if encoding is not None:
+        parts.append('encoding=%s' % encoding.lower())
+    return md5('\0'.join(parts)).hexdigest()[:16]
+
+def etagMatches(header, etag):
+    '''Return whether an If-None-Match header matches an entity tag.  As
+    If-None-Match requires, entity tags are compared weakly.
+
+    >>> fingerprints.etagMatches('"a", W/"b"', '"b"')
+    True
+    >>> fingerprints.etagMatches('"a"', '"b"')
+    False
+    >>> fingerprints.etagMatches('*', '"b"')
+    True
+    '''
+    if header.strip() == '*':
+        return True
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -18,14 +18,283 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """
 
-from formencode import schema
 from odict import OrderedDict
-from xml.sax.saxutils import quoteattr, escape
+from values import adaptValues
+from templates import defaultBackend, encodeText, encodeStatic
+from basicwidgets.escaping import quoteattr, escape
+from basicwidgets import widgetclasses
 from string import Template
+import copy
 
 __doc__  = '''Simple form class that can be used and customized directly, or
 subclassed.'''
 
+class LazyField(object):
+    '''A placeholder for a field that is only built when it is first needed.
+
+    Building a field means copying its validator and constructing its widget,
+    which is wasted work for fields that most users never see.  A LazyField
+    can be stored in a form in place of a real field; it holds a factory (any
+    callable taking no arguments and returning a normal field, typically a
+    lambda wrapping one of the basicwidgets transformer functions) and an
+    optional visibility predicate.  The factory is called the first time the
+    field is actually rendered, validated or fetched from the form, and its
+    result is reused from then on::
+
+        form['spouse'] = forms.LazyField(
+            lambda: widgets.TextInput(validators.NotEmpty(), 'Spouse'),
+            visible=lambda values: values.get('married') == 'yes')
+
+    Fields whose predicate returns false for the submitted values are skipped
+    entirely, both when rendering and when validating through the form's
+    schema.
+
+    @ivar factory: the callable that builds the real field
+    @ivar visible: a callable taking the values dict and returning whether the
+    field should be shown, or None if the field is always shown
+    @ivar field: the materialized field, or None if it hasn't been built yet
+    '''
+
+    def __init__(self, factory, visible=None):
+        self.factory = factory
+        self.visible = visible
+        self.field = None
+
+    def isVisible(self, values):
+        "Return whether the field should be shown, given the submitted values"
+        if self.visible is None:
+            return True
+        return bool(self.visible(values))
+
+    def materialize(self):
+        "Build the real field if that hasn't been done yet, and return it"
+        if self.field is None:
+            self.field = self.factory()
+        return self.field
+
+def _embeddedForm(field):
+    "Return the form a field embeds (see the subforms module), or None"
+    form = getattr(getattr(field, 'renderer', None), 'form', None)
+    if isinstance(form, BaseForm):
+        return form
+    return None
+
+class _Building(object):
+    "The context manager returned by L{BaseForm.building}"
+
+    def __init__(self, form):
+        self.form = form
+
+    def __enter__(self):
+        self.form._building += 1
+        return self.form
+
+    def __exit__(self, type, value, traceback):
+        form = self.form
+        form._building -= 1
+        if not form._building:
+            form._flush()
+        return False
+
+#   The templates and settings that a form's rendering depends on, which can be
+#   changed for a whole class of forms at once (i.e. "BaseForm.compact = True")
+#   without any form being told
+RENDER_SETTINGS = ('formTpl', 'labelTpl', 'errorTpl', 'normalFieldTpl',
+    'bareFieldTpl', 'footer', 'reqLabelTpl', 'fieldSeparator', 'compact',
+    'compactFieldSeparator', 'templateBackend', 'translator')
+
+def _intern(name):
+    "Intern a name, if it can be interned"
+    if type(name) is str:
+        return intern(name)
+    return name
+
+def _jsonValue(value):
+    "Return a value in a form that json.dumps can serialize"
+    if value is None or isinstance(value, (basestring, bool, int, long, float)):
+        return value
+    elif isinstance(value, (list, tuple)):
+        return [_jsonValue(item) for item in value]
+    elif isinstance(value, dict): # i.e. the value of a subform
+        return dict([(_jsonKey(key), _jsonValue(item)) for key, item in value.items()])
+    return u'%s' % (value,)
+
+def _jsonKey(key):
+    if isinstance(key, basestring):
+        return key
+    return u'%s' % (key,)
+
+def _jsonError(error):
+    "Return an error message, or the dict or list of the errors of a subform, as json.dumps can serialize it"
+    if not error:
+        return None
+    elif isinstance(error, (list, tuple)):
+        return [_jsonError(item) for item in error]
+    elif isinstance(error, dict):
+        return dict([(_jsonKey(key), _jsonError(item)) for key, item in error.items()])
+    return u'%s' % (error,)
+
+class _LocalizedField(object):
+    '''A stand-in for a field that renders with a translated copy of the
+    field's widget, and is otherwise the field itself.'''
+
+    def __init__(self, field, renderer):
+        self.field = field
+        self.renderer = renderer
+
+    def __getattr__(self, name):
+        return getattr(self.field, name)
+
+def _takesWidgetName(renderField):
+    "Return whether a renderField method can be given a widgetName"
+    import inspect
+    try:
+        args, varargs, varkw, defaults = inspect.getargspec(renderField)
+    except TypeError: # not a python function
+        return True
+    return bool(varargs or varkw) or 'widgetName' in args or len(args) > 4
+
+class _RenderPlan(object):
+    '''Everything about rendering a form that doesn't depend on the values and
+    errors it is rendered with, worked out once.  The plan assumes that the
+    form isn't changed while it is in use.  A plan for a locale renders the
+    form's labels, submit label and options translated into it.'''
+
+    def __init__(self, form, locale=None):
+        self.form = form
+        self.locale = locale
+        self.template = form.compileTemplate(form.formTpl)
+        if form.compact:
+            self.separator = form.compactFieldSeparator
+        else:
+            self.separator = form.fieldSeparator
+        if locale is None:
+            self.footer = form.renderFooter()
+        else:
+            self.footer = form.renderFooter(form.translate(form.submitLabel, locale))
+#       forms that render their fields themselves have to be left to it, and
+#       can only render with name prefixes if their renderField takes them
+        self.generic = form.__class__.renderField.im_func is not BaseForm.renderField.im_func
+        self.prefixable = not self.generic or _takesWidgetName(form.renderField)
+#       and forms that render their widgets themselves are rendered a whole
+#       field at a time
+        self.wholeFields = form.__class__.renderWidget.im_func is not BaseForm.renderWidget.im_func
+
+        self.fields = []
+        self._names = {}
+        needsMultipart = False
+        for name in form.iterkeys():
+            field = dict.__getitem__(form, name)
+            if isinstance(field, LazyField):
+                self.fields.append((name, field))
+            else:
+                self.fields.append((name, self.fieldPlan(field)))
+                needsMultipart = needsMultipart or getattr(field.renderer, 'needsMultipart', False)
+        self._lazyPlans = {}
+
+        if needsMultipart:
+            form.attrs['enctype'] = 'multipart/form-data'
+        self.formAttributes = form.renderAttributes(form.attrs)
+
+    def fieldPlan(self, field):
+        '''Return a (format, params, widget) tuple for rendering a field, the
+        (possibly localized) field itself for fields that have to be rendered
+        whole, or None for forms that render their fields themselves'''
+        if self.generic:
+            return None
+        if self.locale is not None:
+            field = self.form.localizeField(field, self.locale)
+#       nested fields (i.e. subforms) render their own errors, and templates
+#       that can't be split into fragments are filled in whole
+        if self.wholeFields or getattr(field.renderer, 'nested', False) or \
+            not hasattr(self.form.compileTemplate(self.form.fieldTemplate(field)), 'statics'):
+            return field
+        format, params = self.form.fieldFormat(field)
+        widget = field.renderer
+        if self.form.compact:
+            widget = getattr(widget, 'renderCompact', widget)
+        return format, params, widget
+
+    def _lazyPlan(self, name, placeholder):
+        try:
+            return self._lazyPlans[name]
+        except KeyError:
+            field = placeholder.materialize()
+            if getattr(field.renderer, 'needsMultipart', False) and 'enctype' not in self.form.attrs:
+                self.form.attrs['enctype'] = 'multipart/form-data'
+                self.formAttributes = self.form.renderAttributes(self.form.attrs)
+            fieldPlan = self._lazyPlans[name] = self.fieldPlan(field)
+            return fieldPlan
+
+    def prefixedNames(self, prefix):
+        '''Return the names of the fields with a prefix prepended, in order,
+        working them out only once per prefix'''
+        try:
+            return self._names[prefix]
+        except KeyError:
+            if len(self._names) >= 1024:
+                self._names.clear()
+            names = self._names[prefix] = [_intern(prefix + name) for name, fieldPlan in self.fields]
+            return names
+
+    def renderFields(self, values, errors, prefix=''):
+        "Render the fields of a submission, and return them as a list"
+        form = self.form
+        if prefix and not self.prefixable:
+            raise TypeError("%s.renderField doesn't take a widgetName argument, so its fields can't be rendered with a name prefix"
+                % form.__class__.__name__)
+        rendered = []
+        for (name, fieldPlan), widgetName in zip(self.fields, self.prefixedNames(prefix)):
+            if isinstance(fieldPlan, LazyField):
+                if not fieldPlan.isVisible(values):
+                    continue
+                fieldPlan = self._lazyPlan(name, fieldPlan)
+
+            value, error = values.get(name, None), errors.get(name, None)
+            if fieldPlan is None:
+                if prefix:
+                    rendered.append(form.renderField(name, value, error, widgetName))
+                else:
+                    rendered.append(form.renderField(name, value, error))
+                continue
+            elif not isinstance(fieldPlan, tuple):
+                rendered.append(form._renderField(fieldPlan, widgetName, value, error, self.locale))
+                continue
+
+            format, params, widget = fieldPlan
+            args = []
+            for param in params:
+                if param == 'widget':
+                    args.append(widget(widgetName, value))
+                else:
+                    args.append(form.renderError(error))
+            rendered.append((format % tuple(args)).strip())
+        return rendered
+
+    def render(self, values, errors, prefix='', fieldsOnly=False):
+        "Render a submission"
+        values, errors = adaptValues(values), errors or {}
+        fields = self.separator.join(self.renderFields(values, errors, prefix))
+        if fieldsOnly:
+            return fields
+        elif not hasattr(self.template, 'statics'):
+            return self.template.substitute(fields=fields, footer=self.footer,
+                formAttributes=self.formAttributes)
+
+        output = []
+        for static, param in zip(self.template.statics, self.template.names):
+            output.append(static)
+            if param == 'fields':
+                output.append(fields)
+            elif param == 'footer':
+                output.append(self.footer)
+            elif param == 'formAttributes':
+                output.append(self.formAttributes)
+            else:
+                raise KeyError(param)
+        output.append(self.template.statics[-1])
+        return ''.join(output)
+
 class BaseForm(OrderedDict):
     '''A basic formencode-enabled html form, designed to be easily customizable
     through subclassing.
@@ -36,12 +305,15 @@ class BaseForm(OrderedDict):
     fields of the form, so this means that to display the form's fields in a
     particular order, you should add those fields to the form in the order they
     should be displayed.  You can set the order manually by setting the
-    "sequence" element too.  
+    "sequence" element too.  Forms with many fields are built faster with
+    L{addFields}, or inside a L{building} block.
 
-    The creation of a BaseForm instance also causes a formencode schema instance
-    to be created, which is accessible via the "schema" attribute.  The BaseForm
+    Each BaseForm instance also has a formencode schema instance, which is
+    accessible via the "schema" attribute.  The BaseForm
     instance and schema instance are linked, so that any fields that are added
-    to the form are also added to the schema (and vice versa).
+    to the form are also added to the schema (and vice versa).  The schema (and
+    formencode itself) is only loaded the first time the attribute is used, so
+    processes that only render forms never need to import formencode.
     
     BaseForm is intended to be a minimalistic implementation of a formulaic form
     that more sophisticated forms can subclass.  But its still quite
@@ -66,6 +338,17 @@ class BaseForm(OrderedDict):
     should be rendered", as that is the special case it was created to address,
     but it can be used with any field that requires extra control over layout.
 
+    Fields can also be added as L{LazyField} placeholders, which are only
+    built when first needed and can be hidden depending on the submitted
+    values.  Fetching such a field from the form (i.e. "form['name']") builds
+    it.
+
+    Setting the "compact" attribute (again, on the class or on an instance)
+    renders forms without the whitespace that only makes the markup readable:
+    the templates are minified once when they are compiled, fields are joined
+    with I{compactFieldSeparator}, and widgets are asked for their compact
+    rendering.  Whitespace inside I{<textarea/>} values is never touched.
+
     @cvar formTpl: The template for the entire form.  Accepts three template
     parameters: I{$fields} (the final, joined rendering of all the fields of the
     form), I{$formAttributes} (a single, joined string rendering of all the html
@@ -95,11 +378,31 @@ class BaseForm(OrderedDict):
     normal or bare or whatever (because it takes no parameters, it is just a
     string, not a template).
 
+    @cvar compact: whether to render in compact mode
+
+    @cvar compactFieldSeparator: the string used instead of I{fieldSeparator}
+    to join fields in compact mode.
+
+    @cvar templateBackend: the L{templates.TemplateBackend} that compiles the
+    form's templates
+
+    @cvar translator: a callable taking a text and a locale and returning the
+    text translated into the locale, used by L{renderLocalized} (see
+    L{translate})
+
+    @cvar localeCacheSize: how many locales L{renderLocalized} keeps the
+    prepared rendering of, per form
+
     @ivar attrs: html attributes for the I{<form/>} element
     '''
 
 #   Settings for rendering the entire form
     fieldSeparator = '\n\n' 
+    compact = False
+    compactFieldSeparator = ''
+    templateBackend = defaultBackend
+    translator = None
+    localeCacheSize = 16
     formTpl = '''\
 <form $formAttributes>
 
@@ -136,9 +439,16 @@ $error'''
         take precedence.
         @type attrs: dict
         '''
+        self._lazyNames = set()
+        self._schema = None
+        self._version = 0
+        self._building = 0
+        self._pending = self._pendingTouch = self._pendingNested = False
+        self._derived = {}
+        self._fieldDigests = {}
+        self._nestedForms = []
+        self._widgetGeneration, self._widgetRevision = None, 0
         OrderedDict.__init__(self)
-        self.schema = schema.Schema()
-        self.schema.fields = self 
 
         self.attrs = {'method':method, 'action':action}
         if attrs:
@@ -146,6 +456,353 @@ $error'''
 
         self.submitLabel = submitLabel
 
+    def __getSchema(self):
+        if self._schema is None:
+            from schemas import FormSchema
+            self._schema = FormSchema()
+            self._schema.fields = self 
+        return self._schema
+    def __setSchema(self, schema):
+        self._schema = schema
+    schema = property(__getSchema, __setSchema)
+
+    def __getitem__(self, name):
+        field = dict.__getitem__(self, name)
+        if isinstance(field, LazyField):
+            return field.materialize()
+        return field
+
+    def __setitem__(self, name, field):
+        if isinstance(field, LazyField):
+            self._lazyNames.add(name)
+        else:
+            self._lazyNames.discard(name)
+        replaced = _embeddedForm(dict.get(self, name))
+        OrderedDict.__setitem__(self, name, field)
+#       the list of embedded forms only has to be found again when an embedded
+#       form is replaced; an added one is just appended
+        if replaced is not None:
+            self._nestedChanged()
+        else:
+            form = _embeddedForm(field)
+            if form is not None:
+                self._nestedForms.append(form)
+        self._changed()
+
+    def __delitem__(self, name):
+        removed = _embeddedForm(dict.get(self, name))
+        OrderedDict.__delitem__(self, name)
+        self._lazyNames.discard(name)
+        if removed is not None:
+            self._nestedChanged()
+        self._changed()
+
+    def addFields(self, fields):
+        '''Add many fields at once, in order, as if by setting each of them
+        (fields that the form already has are replaced, and keep their place).
+        This is much faster than setting them one by one, for forms with
+        hundreds or thousands of fields; see also L{building}.
+
+        @param fields: (name, field) pairs, or an OrderedDict of fields (i.e.
+        another form, whose L{LazyField}s are added unbuilt)
+        '''
+        if isinstance(fields, OrderedDict):
+            fields = [(name, dict.__getitem__(fields, name)) for name in fields.iterkeys()]
+
+        building = self.building()
+        building.__enter__()
+        try:
+#           OrderedDict keeps the order of its keys in a private list, which
+#           is appended to directly to skip its per-item bookkeeping
+            sequence = self._OrderedDict__sequence
+            lazyNames, nestedForms, replaced = self._lazyNames, self._nestedForms, False
+            for name, field in fields:
+                if not dict.__contains__(self, name):
+                    sequence.append(name)
+                elif nestedForms and _embeddedForm(dict.__getitem__(self, name)) is not None:
+                    replaced = True
+                dict.__setitem__(self, name, field)
+                if isinstance(field, LazyField):
+                    lazyNames.add(name)
+                else:
+                    lazyNames.discard(name)
+                    form = _embeddedForm(field)
+                    if form is not None:
+                        nestedForms.append(form)
+            if replaced:
+                self._nestedChanged()
+            self._changed()
+        finally:
+            building.__exit__(None, None, None)
+
+    def building(self):
+        '''Return a context manager that defers the form's bookkeeping while
+        it is being built::
+
+            with form.building():
+                for question in survey:
+                    form[question.name] = questionField(question)
+                del form['legacy']
+                form.sequence = sortedNames
+
+        Fields added, removed and reordered inside the block (and attributes
+        set, and calls to L{touch}) only change the form's L{version} (and so
+        invalidate what it has derived from its definition, see L{derived})
+        once, when the outermost block ends.  Rendering the form inside the
+        block is still correct, just not faster.  As with any other change to
+        a form, don't build a form while other threads are rendering it.
+
+        On python 2.4, call the context manager's I{__enter__} and
+        I{__exit__} methods (the latter with three Nones) yourself.
+        '''
+        return _Building(self)
+
+    def _nestedChanged(self):
+        "Record that the forms embedded in this one may have changed"
+        if self._building:
+            self._pendingNested = True
+        else:
+            self._findNestedForms()
+
+    def clear(self):
+        OrderedDict.clear(self)
+        self._lazyNames.clear()
+        self._nestedForms = []
+        self._changed()
+
+    def _findNestedForms(self):
+        "Find the forms embedded in this one (see the subforms module)"
+        nested = []
+        for name in self.iterkeys():
+            form = _embeddedForm(dict.__getitem__(self, name))
+            if form is not None:
+                nested.append(form)
+        self._nestedForms = nested
+
+    def __setSequence(self, sequence):
+        OrderedDict.sequence.fset(self, sequence)
+        self._changed()
+    sequence = property(OrderedDict.sequence.fget, __setSequence)
+
+    def __setattr__(self, name, value):
+        OrderedDict.__setattr__(self, name, value)
+        if not name.startswith('_'):
+            self._changed()
+
+    def _changed(self):
+        "Record a change to the form's definition that the form knows the extent of"
+        if self._building:
+            self._pending = True
+        else:
+            self._version += 1
+
+    def touch(self):
+        '''Record that the form's definition has changed.  This happens
+        automatically when fields are added, removed or reordered, and when
+        attributes of the form or of any widget are set; call it yourself after
+        changing something in place, such as the form's I{attrs} dict or a
+        widget's I{options} list.  This also makes the form's widgets forget
+        the renderings they remember (see L{memoStatistics}).'''
+        if self._building:
+            self._pending = self._pendingTouch = True
+            return
+        self._version += 1
+        self._forget()
+
+    def _forget(self):
+        "Forget what has been worked out about the form's fields"
+#       the change could have been to any field
+        self._fieldDigests.clear()
+        for field in self._materializedFields():
+            clearMemo = getattr(field.renderer, 'clearMemo', None)
+            if clearMemo is not None:
+                clearMemo()
+
+    def _materializedFields(self):
+        "Return the fields that have been built, i.e. all but unused lazy ones"
+        fields = []
+        for name in self.iterkeys():
+            field = dict.__getitem__(self, name)
+            if isinstance(field, LazyField):
+                field = field.field
+            if field is not None:
+                fields.append(field)
+        return fields
+
+    def memoStatistics(self):
+        '''Return statistics about the memos of the form's widgets (see
+        I{memoSize} in the L{basicwidgets.widgetclasses.Widget} class), summed
+        over the widgets that have one: the number of "hits" and "misses", the
+        "hitRate", and the number of widgets that have a memo ("widgets").
+
+        Widgets only remember their renderings if their I{memoSize} is set,
+        i.e. "form['agree'].renderer.memoSize = 8", or "Select.memoSize = 64"
+        for every select widget.
+
+        @rtype: dict
+        '''
+        hits = misses = widgets = 0
+        for field in self._materializedFields():
+            if not getattr(field.renderer, 'memoSize', 0):
+                continue
+            info = field.renderer.memoInfo()
+            hits, misses, widgets = hits + info['hits'], misses + info['misses'], widgets + 1
+        calls = hits + misses
+        return {'hits':hits, 'misses':misses, 'widgets':widgets,
+            'hitRate':calls and float(hits) / calls or 0.0}
+
+    def _flush(self):
+        "Apply the changes deferred while the form is being built (see L{building})"
+        pending, touched, nested = self._pending, self._pendingTouch, self._pendingNested
+        self._pending = self._pendingTouch = self._pendingNested = False
+        if nested:
+            self._findNestedForms()
+        if touched:
+            self._forget()
+        if pending:
+            self._version += 1
+
+    def __getVersion(self):
+        if self._pending or self._pendingNested:
+            self._flush()
+        return self._version
+    version = property(__getVersion, doc='''A number that changes whenever the
+    form's definition does (see L{touch})''')
+
+    def _derivedKey(self):
+        "Return what the things derived from the form's definition are keyed on"
+        if self._pending or self._pendingNested:
+            self._flush()
+        key = (self._version, self._latestWidgetRevision(),
+            tuple([getattr(self, setting, None) for setting in RENDER_SETTINGS]))
+        for form in self._nestedForms:
+            key += form._derivedKey()
+        return key
+
+    def _latestWidgetRevision(self):
+        "Return the latest revision of the form's widgets, i.e. when one of them last changed"
+#       widgets elsewhere in the process change all the time (every widget
+#       built changes), but this form's widgets can only have changed if some
+#       widget did
+        generation = widgetclasses.generation
+        if self._widgetGeneration != generation:
+            revision = 0
+            for field in self._materializedFields():
+                revision = max(revision, getattr(getattr(field, 'renderer', None), 'revision', 0))
+            self._widgetGeneration, self._widgetRevision = generation, revision
+        return self._widgetRevision
+
+    def derived(self, name, build):
+        '''Return something worked out from the form's definition, building it
+        with I{build} only if the definition has changed since it was last
+        built.  This is how forms cache what they can reuse between renders.
+
+        @param name: the name to cache the result under
+        @type name: str
+        @param build: a callable taking no arguments that builds the result
+        '''
+        key = self._derivedKey()
+        try:
+            entry = self._derived[name]
+            if entry[0] == key:
+                return entry[1]
+        except KeyError:
+            pass
+        result = build()
+        self._derived[name] = (key, result)
+        return result
+
+    def fingerprint(self):
+        '''Return a digest of everything about the form's definition that its
+        rendering depends on: the order of its fields, their widgets (classes,
+        html attributes, labels, options and so on), its templates, html
+        attributes and submit label.  Forms with the same fingerprint render
+        the same values and errors identically, in any process.
+
+        The fingerprint is kept up to date as the form changes (see L{touch}):
+        only the fields whose widgets have changed since it was last worked out
+        are digested again.
+
+        @rtype: str
+        '''
+        import fingerprints
+        return self.derived('fingerprint', lambda: fingerprints.formFingerprint(self))
+
+    def etag(self, values, errors, locale=None, encoding=None):
+        '''Return an HTTP entity tag for the rendering of the form with the
+        given values and errors (in the given locale, for
+        L{renderLocalized}, and encoded with the given encoding, for
+        L{renderBytes}), without rendering it.  Renderings in different
+        encodings are different entities, and get different tags.
+
+        @return: a quoted, strong entity tag
+        @rtype: str
+        '''
+        import fingerprints
+        return '"%s-%s"' % (self.fingerprint(), fingerprints.submissionDigest(self, values, errors, locale, encoding))
+
+    def renderIfNoneMatch(self, ifNoneMatch, values, errors, locale=None, encoding=None):
+        '''Render the form, unless the client already has the rendering: if
+        the entity tag of the rendering (see L{etag}) matches the client's
+        I{If-None-Match} header, nothing is rendered, and the response should
+        be "304 Not Modified".  Either way, the entity tag should be sent in the
+        response's I{ETag} header::
+
+            etag, body = form.renderIfNoneMatch(environ.get('HTTP_IF_NONE_MATCH'), {}, {})
+            if body is None:
+                start_response('304 Not Modified', [('ETag', etag)])
+                return []
+
+        @param ifNoneMatch: the value of the request's If-None-Match header, or
+        None if it had none
+        @param locale: the locale to render in, or None to render with
+        L{render}
+        @param encoding: the encoding to encode the rendering with (see
+        L{renderBytes}), or None to not encode it
+        @return: an (etag, rendering) tuple, where rendering is None if the
+        client's copy is current
+        @rtype: tuple
+        '''
+        import fingerprints
+        etag = self.etag(values, errors, locale, encoding)
+        if ifNoneMatch and fingerprints.etagMatches(ifNoneMatch, etag):
+            return etag, None
+        if locale is not None:
+            output = self.renderLocalized(values, errors, locale)
+            if encoding is not None:
+                output = encodeText(output, encoding)
+        elif encoding is not None:
+            output = self.renderBytes(values, errors, encoding)
+        else:
+            output = self.render(values, errors)
+        return etag, output
+
+    def hasLazyFields(self):
+        "Return whether any of this form's fields are L{LazyField} placeholders"
+        return bool(self._lazyNames)
+
+    def visibleFields(self, values):
+        '''Return the (name, field) pairs of the fields that should be shown for
+        the given values, in order.  L{LazyField} placeholders that are visible
+        are materialized; those that aren't are left out (and left unbuilt).
+
+        @param values: a dict of values submitted by the user
+        @type values: dict
+        @rtype: list
+        '''
+        if not self._lazyNames:
+            return self.items()
+
+        output = []
+        for name in self.iterkeys():
+            field = dict.__getitem__(self, name)
+            if isinstance(field, LazyField):
+                if not field.isVisible(values):
+                    continue
+                field = field.materialize()
+            output.append((name, field))
+        return output
+
     @staticmethod
     def renderAttributes(attrs=None, **kwargs):
         '''Render a dictionary of an element's attribute names and values into a
@@ -171,7 +828,7 @@ $error'''
 
         output = []
         for name, value in attrs.items() + kwargs.items():
-            output.append('%s=%s' % (name, quoteattr(str(value))))
+            output.append('%s=%s' % (name, quoteattr('%s' % (value,))))
         return ' '.join(output)
 
     def smartRender(self, values, errors):
@@ -187,7 +844,9 @@ $error'''
         @param values: a dict of values submitted by the user.  If formencode's
         conventions for organizing inputs into lists and dicts are being used,
         this processing should be done on the dict before this method is called,
-        since the method does not do such transformation itself.  @type values:
+        since the method does not do such transformation itself.  Request
+        objects such as cgi.FieldStorage instances and multi-dicts can be passed
+        directly; see the L{values} module.  @type values:
         dict 
         
         @param errors: a dict of error messages generated during
@@ -204,10 +863,13 @@ $error'''
         @rtype: str
         """
 
-        submissionKeys = set(values.keys())
-        formKeys = set(self.keys())
+        values = adaptValues(values)
 
-        if not submissionKeys.intersection(formKeys):
+#       if none of this form's fields were submitted, this is a first view
+        for name in self.iterkeys():
+            if name in values:
+                break
+        else:
             errors = {}
 
         return self.render(values, errors)
@@ -221,7 +883,9 @@ $error'''
         @param values: a dict of values submitted by the user.  If formencode's
         conventions for organizing inputs into lists and dicts are being used,
         this processing should be done on the dict before this method is called,
-        since the method does not do such transformation itself.  @type values:
+        since the method does not do such transformation itself.  Request
+        objects such as cgi.FieldStorage instances and multi-dicts can be passed
+        directly; see the L{values} module.  @type values:
         dict 
         
         @param errors: a dict of error messages generated during
@@ -237,28 +901,254 @@ $error'''
 
         @rtype: str'''
 
-        renderedFields = []
-        needsMultipart = False
+        return ''.join(self._iterFragments(values, errors))
 
-#       Render each user field
-        for name, field in self.schema.fields.items():
-            value, error = values.get(name, None), errors.get(name, None)
-            renderedFields.append(self.renderField(name, value, error))
-            if getattr(field.renderer, 'needsMultipart', False):
-                needsMultipart = True
+    def iterRender(self, values, errors):
+        '''Like L{render}, but returns an iterator over successive fragments of
+        the rendering instead of one string, so that the form can be streamed
+        (for instance, returned as the body of a WSGI response) without the
+        whole document ever being joined together.
 
-#       Render the submit button
-        footer = self.renderFooter()
+        @return: an iterator of strings
+        '''
+        return self._iterFragments(values, errors)
 
-        # if any widgets require the form to use multipart encoding
-        if needsMultipart: 
-            self.attrs['enctype'] = 'multipart/form-data'
+    def renderBytes(self, values, errors, encoding='utf-8'):
+        '''Like L{render}, but returns the form already encoded.  The static
+        parts of the form's templates are only ever encoded once, and characters
+        that the encoding can't represent are replaced by html character
+        references.
 
-        fields = self.fieldSeparator.join(renderedFields)
-        formAttributes = self.renderAttributes(self.attrs)
-        return Template(self.formTpl).substitute(fields=fields, footer=footer, formAttributes=formAttributes)
+        @param encoding: the name of the encoding to use
+        @type encoding: str
+        @return: the encoded rendering of the form
+        @rtype: str
+        '''
+        return ''.join(self._iterFragments(values, errors, encoding))
 
-    def renderField(self, name, value, error=None):
+    def iterBytes(self, values, errors, encoding='utf-8'):
+        '''Like L{renderBytes}, but returns an iterator over successive encoded
+        fragments, as L{iterRender} does.
+
+        @return: an iterator of encoded strings
+        '''
+        return self._iterFragments(values, errors, encoding)
+
+    def renderMany(self, rows, fieldsOnly=False):
+        '''Render the form once for each of a number of submissions, as on
+        pages that list or bulk-edit many records.  Everything that doesn't
+        depend on the values and errors (compiled templates, labels, the
+        footer, the form attributes) is worked out once and reused for every
+        row.
+
+        Each row can be given a name prefix, which is prepended to the names
+        its widgets are rendered with (but not to the keys its values and
+        errors are looked up by), so that several rows can be submitted in one
+        html form without their fields colliding.  Using prefixes like
+        "items-3." gives names that formencode's variabledecode module
+        understands.  Forms that override I{renderField} can only be given
+        prefixes if their renderField takes the I{widgetName} argument.
+
+        @param rows: an iterable of (values, errors) or (values, errors, prefix)
+        tuples
+        @param fieldsOnly: if true, each row is rendered as just its joined
+        fields, without the form template and footer, for placing several rows
+        inside one html form
+        @type fieldsOnly: bool
+        @return: the renderings of the rows, in order
+        @rtype: list
+        '''
+        return list(self.iterRenderMany(rows, fieldsOnly))
+
+    def iterRenderMany(self, rows, fieldsOnly=False):
+        '''Like L{renderMany}, but returns an iterator that renders each row
+        as it is needed, so that memory use doesn't grow with the number of
+        rows.'''
+        plan = _RenderPlan(self)
+        for row in rows:
+            if len(row) > 2:
+                values, errors, prefix = row
+            else:
+                (values, errors), prefix = row, ''
+            yield plan.render(values, errors, prefix, fieldsOnly)
+
+    def renderLocalized(self, values, errors, locale):
+        '''Like L{render}, but with the labels of the fields, the submit label
+        and the texts of options translated into a locale (see L{translate}).
+
+        The form's widgets aren't changed, so one form can be rendered in
+        several locales at once by different threads.  Instead, everything that
+        doesn't depend on the values and errors is prepared once per locale,
+        with translated copies of the widgets, and kept for the most recently
+        used I{localeCacheSize} locales until the form's definition changes.
+        Forms that override I{renderField} render their fields themselves, and
+        so only get their submit label translated.  The fields of embedded
+        forms (see the L{subforms} module) are rendered in the same locale, by
+        the embedded form with its own translator.
+
+        @param locale: the locale to translate into, in whatever form the
+        form's translator expects (i.e. "de_DE")
+        @return: the string rendering of the form
+        @rtype: str
+        '''
+        return self._localePlan(locale).render(values, errors)
+
+    def _localePlan(self, locale):
+        "Return the render plan for a locale, from the form's LRU cache of them"
+        plans, order = self.derived('localePlans', lambda: ({}, []))
+        try:
+            plan = plans[locale]
+        except KeyError:
+            plan = plans[locale] = _RenderPlan(self, locale)
+            order.append(locale)
+            while len(order) > self.localeCacheSize:
+                plans.pop(order.pop(0), None)
+            return plan
+
+        if order[-1] != locale:
+#           another thread may have moved it already
+            try:
+                order.remove(locale)
+                order.append(locale)
+            except ValueError:
+                pass
+        return plan
+
+    def translate(self, text, locale):
+        '''Translate a label or option text into a locale.  By default, this
+        calls the form's I{translator} (i.e. a function wrapping the ugettext
+        method of the right gettext translations) if it has one, and returns
+        the text unchanged otherwise.
+
+        @rtype: str
+        '''
+        if self.translator is None or text is None:
+            return text
+        return self.translator(text, locale)
+
+    def localizeField(self, field, locale):
+        '''Return a stand-in for a field whose widget is a copy of the field's
+        widget with its label, and the texts of its options, translated into a
+        locale.  Option texts are only translated for widgets that support it
+        (by having an "optionLabels" attribute), and never for option
+        catalogs, whose markup is built ahead of time (build one catalog per
+        locale instead).'''
+        renderer = copy.copy(field.renderer)
+#       the copy is private to the stand-in, so there's no need to tell other
+#       forms about it by going through Widget.__setattr__ (and it mustn't share
+#       the original's memo of renderings)
+        renderer.__dict__.pop('_memo', None)
+        renderer.__dict__['label'] = self.translate(field.renderer.label, locale)
+
+        options = getattr(renderer, 'options', None)
+        if hasattr(renderer, 'optionLabels') and options is not None and not hasattr(options, 'renderOptions'):
+            if hasattr(options, 'keys'): # if options was a dict
+                texts = options.values()
+            else:
+                texts = options
+            optionLabels = {}
+            for text in texts:
+                if isinstance(text, basestring):
+                    optionLabels[text] = self.translate(text, locale)
+            renderer.__dict__['optionLabels'] = optionLabels
+        return _LocalizedField(field, renderer)
+
+    def renderFields(self, values, errors, prefix='', locale=None):
+        '''Render just the form's fields, joined with its field separator,
+        without the form template and footer.  Everything that doesn't depend
+        on the values and errors is worked out once per version of the form's
+        definition, and so are the prefixed names of its fields, once per
+        prefix.
+
+        @param prefix: a prefix for the names the widgets are rendered with
+        (see L{renderMany})
+        @type prefix: str
+        @param locale: the locale to translate the labels into, if any (see
+        L{renderLocalized})
+        @rtype: str
+        '''
+        if locale is None:
+            plan = self.derived('renderPlan', lambda: _RenderPlan(self))
+        else:
+            plan = self._localePlan(locale)
+        return plan.render(values, errors, prefix, fieldsOnly=True)
+
+    def _iterFragments(self, values, errors, encoding=None):
+        "Generate the fragments of the rendered form, encoded if an encoding is given"
+        values = adaptValues(values)
+        fields = self.visibleFields(values)
+
+        # if any widgets require the form to use multipart encoding
+        for name, field in fields:
+            if getattr(field.renderer, 'needsMultipart', False):
+                self.attrs['enctype'] = 'multipart/form-data'
+                break
+
+        template = self.compileTemplate(self.formTpl)
+        if self.compact:
+            separator = self.compactFieldSeparator
+        else:
+            separator = self.fieldSeparator
+
+#       templates that can't be split into fragments are filled in whole
+        if not hasattr(template, 'statics'):
+            rendered = [self.renderField(name, values.get(name, None), errors.get(name, None)) for name, field in fields]
+            output = template.substitute(fields=separator.join(rendered),
+                footer=self.renderFooter(), formAttributes=self.renderAttributes(self.attrs))
+            if encoding is not None:
+                output = encodeText(output, encoding)
+            yield output
+            return
+
+        if encoding is None:
+            statics = template.statics
+            encode = lambda text: text
+        else:
+            statics = template.encodedStatics(encoding)
+            separator = encodeStatic(separator, encoding)
+            encode = lambda text: encodeText(text, encoding)
+
+        for static, param in zip(statics, template.names):
+            if static:
+                yield static
+            if param == 'fields':
+#               Render each user field that should be shown
+                first = True
+                for name, field in fields:
+                    if not first:
+                        yield separator
+                    first = False
+                    yield encode(self.renderField(name, values.get(name, None), errors.get(name, None)))
+            elif param == 'footer':
+                yield encode(self.renderFooter()) # Render the submit button
+            elif param == 'formAttributes':
+                yield encode(self.renderAttributes(self.attrs))
+            else:
+                raise KeyError(param)
+        if statics[-1]:
+            yield statics[-1]
+
+    def compileTemplate(self, source):
+        '''Return the compiled version of one of this form's template strings,
+        minified if the form is in compact mode, as compiled by the form's
+        I{templateBackend}.
+
+        @return: usually a L{templates.CompiledTemplate}; other backends may
+        return other objects with a "substitute" method
+        '''
+        return self.templateBackend.compile(source, self.compact)
+
+    def renderWidget(self, field, name, value):
+        '''Render just the widget of a field (i.e. without its label or error
+        message), compactly if the form is in compact mode and the widget
+        supports it.'''
+        if self.compact:
+            renderCompact = getattr(field.renderer, 'renderCompact', None)
+            if renderCompact is not None:
+                return renderCompact(name, value)
+        return field.renderer(name, value)
+
+    def renderField(self, name, value, error=None, widgetName=None):
         '''Render the complete html of one of this form's fields
 
         @param name: the name of the field to be rendered (i.e. its key within
@@ -270,44 +1160,297 @@ $error'''
         string, though it doesn't have to be.
         @param error: the error message that the field should be rendered with.
         None indicates that it should be rendered without an error.
+        @param widgetName: the name to render the widget with, if it isn't
+        I{name} (as when rendering with a name prefix; see L{renderMany})
+        @type widgetName: str
         @return: the string of the rendered html of the field.
         @rtype: str
         '''
-        field = self[name]
-        widgetStr = field.renderer(name, value)
-
+        return self._renderField(self[name], widgetName or name, value, error)
+
+    def _renderField(self, field, name, value, error=None, locale=None):
+        "Render a field object (i.e. a localized stand-in) with a name, in a locale if one is given"
+        if getattr(field.renderer, 'nested', False):
+#           nested fields render the errors of their own fields themselves
+            if locale is None:
+                widgetStr = field.renderer.renderNested(name, value, error)
+            else:
+                widgetStr = field.renderer.renderNested(name, value, error, locale)
+            if not isinstance(error, basestring):
+                error = None
+        else:
+            widgetStr = self.renderWidget(field, name, value)
+        labelStr, errorStr = self.renderLabel(field), self.renderError(error)
+        template = self.compileTemplate(self.fieldTemplate(field))
+        return template.substitute(label=labelStr, widget=widgetStr, error=errorStr).strip()
+
+#   The three methods below only depend on the field (and not on its value), so
+#   that their results can be worked out once per field ahead of time (see the
+#   codegen module)... subclasses that override them should keep it that way
+    def fieldTemplate(self, field):
+        '''Return the template string that a field should be rendered with:
+        I{bareFieldTpl} if the field requests to be rendered in "bare" mode,
+        I{normalFieldTpl} otherwise.'''
         if getattr(field.renderer, 'renderBare', False):
-            template = self.bareFieldTpl  # if this field should be rendered in bare mode
+            return self.bareFieldTpl  # if this field should be rendered in bare mode
         else: 
-            template = self.normalFieldTpl # if this field should be rendered in normal mode
-        
-        if error:
-            errorStr = Template(self.errorTpl).substitute(error=error)
-        else:
-            errorStr = '' # if there is no error message, nothing is inserted, not even an empty error message
+            return self.normalFieldTpl # if this field should be rendered in normal mode
 
+    def renderLabel(self, field):
+        '''Render the label of a field with I{labelTpl}, or return the empty
+        string if the field has no label.'''
         label = field.renderer.label
         if label is not None:
-            labelStr = Template(self.labelTpl).substitute(label=field.renderer.label)
+            return self.compileTemplate(self.labelTpl).substitute(label=label)
+        else:
+            return ''
+
+    def fieldFormat(self, field):
+        '''Return the template of a field as a string for the "%" operator,
+        with the field's label already filled in, along with the names of the
+        parameters (i.e. "widget" and "error") that it takes, in order.
+
+        @rtype: tuple
+        '''
+        template = self.compileTemplate(self.fieldTemplate(field))
+        label = self.renderLabel(field)
+        parts = [template.statics[0].replace('%', '%%')]
+        params = []
+        for name, static in zip(template.names, template.statics[1:]):
+            if name == 'label':
+                parts.append(label.replace('%', '%%'))
+            elif name in ('widget', 'error'):
+                parts.append('%s')
+                params.append(name)
+            else:
+                raise KeyError(name)
+            parts.append(static.replace('%', '%%'))
+        return ''.join(parts), tuple(params)
+
+    @staticmethod
+    def isRequired(field):
+        "Test to determine whether this is a required field"
+        try:
+            field.to_python(None)
+            return False
+        except:
+            return True
+
+    def renderError(self, error):
+        '''Render an error message with I{errorTpl}, or return the empty string
+        if there is no error.'''
+        if error:
+            return self.compileTemplate(self.errorTpl).substitute(error=error)
         else:
-            labelStr = ''
+            return '' # if there is no error message, nothing is inserted, not even an empty error message
+
+    def describe(self, values, errors):
+        '''Describe the form as plain dicts and lists, ready to be serialized
+        with json.dumps and turned into markup in the browser.  The parts of
+        the description that don't depend on the values and errors are worked
+        out once per version of the form's definition and shared between
+        descriptions, so don't modify them.
+
+        The description is a dict with the form's "attrs", "submitLabel" and
+        "multipart" flag, and a "fields" list, in the form's order, of dicts as
+        returned by L{describeField}, with the field's "value" and "error" (or
+        None) added.  Fields hidden for the given values are left out.
+
+        @param values: the values submitted by the user
+        @param errors: a dict of error messages, as for L{render}
+        @rtype: dict
+        '''
+        static = self.derived('description', self._describeStatic)
+        values, errors = adaptValues(values), errors or {}
+
+        fields = []
+        multipart = static['multipart']
+        for name, description in static['fields']:
+            if isinstance(description, LazyField):
+                if not description.isVisible(values):
+                    continue
+                description = self._describeLazy(name, description)
+                multipart = multipart or description['multipart']
+
+            description = description.copy()
+            description['value'] = _jsonValue(values.get(name, None))
+            description['error'] = _jsonError(errors.get(name, None))
+            fields.append(description)
+
+        return {'attrs':static['attrs'], 'submitLabel':static['submitLabel'],
+            'multipart':multipart, 'fields':fields}
+
+    def _describeStatic(self):
+        fields = []
+        multipart = False
+        for name in self.iterkeys():
+            field = dict.__getitem__(self, name)
+            if isinstance(field, LazyField):
+                fields.append((name, field))
+            else:
+                description = self.describeField(name, field)
+                multipart = multipart or description['multipart']
+                fields.append((name, description))
+        return {'attrs':dict(self.attrs), 'submitLabel':self.submitLabel,
+            'multipart':multipart, 'fields':fields, 'lazy':{}}
+
+    def _describeLazy(self, name, placeholder):
+        lazy = self.derived('description', self._describeStatic)['lazy']
+        try:
+            return lazy[name]
+        except KeyError:
+            description = lazy[name] = self.describeField(name, placeholder.materialize())
+            return description
+
+    def describeField(self, name, field):
+        '''Describe the parts of a field that don't depend on its value: its
+        "name", "label" and "description", the "widget" type (i.e. "text",
+        "select" or "checkbox"), the widget's html "attrs", its "options" (a
+        list of [value, text] pairs, for widgets with options), its "default"
+        value and the "required", "bare" and "multipart" flags.
+
+        Subforms (see the L{subforms} module) are also described by their
+        "repeat" flag and the "fields" of the embedded form, described as by
+        L{describe} with no values.  Their values and errors are dicts (or
+        lists of dicts, for repeated subforms) keyed by the names of the
+        embedded form's fields.
+
+        @rtype: dict
+        '''
+        renderer = field.renderer
+        attrs = dict(getattr(renderer, 'attrs', {}))
+        description = {'name':name, 'label':renderer.label,
+            'description':getattr(renderer, 'description', ''),
+            'widget':renderer.widgetType or attrs.get('type', 'text'),
+            'attrs':attrs, 'default':_jsonValue(getattr(renderer, 'default', None)),
+            'required':self.isRequired(field),
+            'bare':bool(getattr(renderer, 'renderBare', False)),
+            'multipart':bool(getattr(renderer, 'needsMultipart', False))}
+
+        options = getattr(renderer, 'options', None)
+        if hasattr(options, 'keys'): # if options was a dict
+            description['options'] = [[label, item_value] for label, item_value in sorted(options.items())]
+        elif options is not None and not hasattr(options, 'renderOptions'):
+            description['options'] = [[item_value, item_value] for item_value in options]
+
+        nested = getattr(renderer, 'form', None)
+        if getattr(renderer, 'nested', False) and isinstance(nested, BaseForm):
+            description['repeat'] = bool(getattr(renderer, 'repeat', False))
+            description['fields'] = nested.describe({}, {})['fields']
+        return description
+
+    def isVisible(self, name, values):
+        '''Return whether the named field should be shown for the given values
+        (i.e. False only for L{LazyField} placeholders whose predicate rejects
+        the values).'''
+        field = dict.__getitem__(self, name)
+        if isinstance(field, LazyField):
+            return field.isVisible(values)
+        return True
+
+    def validateField(self, name, values, state=None):
+        '''Validate a single field with its own validator, without running
+        the rest of the form's schema (so chained validators are not applied).
+
+        @param name: the name of the field to validate
+        @type name: str
+        @param values: the values submitted by the user; only the value of the
+        named field is used
+        @param state: the formencode state object to validate with
+        @return: a (value, error) tuple.  If validation succeeds, value is the
+        converted value and error is None; if not, value is the value that was
+        submitted and error is the formencode Invalid exception.
+        @rtype: tuple
+        '''
+        from formencode.api import Invalid
+        value = adaptValues(values).get(name, None)
+        try:
+            return self[name].to_python(value, state), None
+        except Invalid, error:
+            return value, error
 
-        return Template(template).substitute(label=labelStr, widget=widgetStr, error=errorStr).strip()
+    def renderFieldUpdate(self, name, values, state=None):
+        '''Validate one field and render it on its own, with its error message
+        if validation fails.  This is intended for answering per-field
+        validation requests (for instance, sent by javascript when the user
+        leaves a field), which only need the markup of that one field back.
+
+        @param name: the name of the field
+        @type name: str
+        @param values: the values submitted by the user
+        @param state: the formencode state object to validate with
+        @return: a (html, error) tuple: the rendering of the field (the empty
+        string if the field is hidden for these values) and the Invalid
+        exception, or None if the field's value is valid
+        @rtype: tuple
+        '''
+        values = adaptValues(values)
+        if not self.isVisible(name, values):
+            return '', None
+        value, error = self.validateField(name, values, state)
+        return self.renderField(name, values.get(name, None), error), error
+
+    def renderChangedFields(self, values, previousValues, previousErrors=None, state=None):
+        '''Validate and render only the fields affected by a new submission.
+
+        A field is affected if its value differs from the previous submission,
+        if it has become visible or hidden, or if it had an error in the
+        previous submission that its own validator no longer produces (as
+        happens with errors from chained validators).  Only those fields are
+        validated, each with its own validator.
+
+        @param values: the values of the new submission
+        @param previousValues: the values of the previous submission
+        @param previousErrors: the errors rendered for the previous submission,
+        if any
+        @param state: the formencode state object to validate with
+        @return: a dict mapping the names of the affected fields to their new
+        renderings.  Fields that have become hidden map to the empty string.
+        @rtype: dict
+        '''
+        values, previousValues = adaptValues(values), adaptValues(previousValues)
+        previousErrors = previousErrors or {}
+        fragments = {}
+
+        for name in self.iterkeys():
+            visible = self.isVisible(name, values)
+            wasVisible = self.isVisible(name, previousValues)
+            if not visible:
+                if wasVisible:
+                    fragments[name] = ''
+                continue
+
+            value = values.get(name, None)
+            changed = not wasVisible or value != previousValues.get(name, None)
+            if not changed and name not in previousErrors:
+                continue
+
+            error = self.validateField(name, values, state)[1]
+            if not changed and '%s' % (error,) == '%s' % (previousErrors[name],):
+                continue
+            fragments[name] = self.renderField(name, value, error)
+
+        return fragments
 
 #   The footer isn't just included as part of the form template because this
 #   this makes it easier to make it look like other fields if BaseForm is customized
 #   or subclassed...
-    def renderFooter(self):
+    def renderFooter(self, submitLabel=None):
         '''Render the footer (submit button) for the form
 
+        @param submitLabel: the label of the submit button, if not the form's
+        I{submitLabel} (as when rendering translated forms)
+        @type submitLabel: str
         @return: the string of the rendered html of the form footer. Typically, this
         will be a submit button, rendered similarly to a normal field.
         @rtype: str
         '''
-        submitLabel = escape(self.submitLabel).replace('"', '&quot;')
-        widgetStr = Template(self.footer).substitute(submitLabel=submitLabel)
+        if submitLabel is None:
+            submitLabel = self.submitLabel
+        submitLabel = escape(submitLabel).replace('"', '&quot;')
+        widgetStr = self.compileTemplate(self.footer).substitute(submitLabel=submitLabel)
         label = ''
-        return Template(self.normalFieldTpl).substitute(label=label, widget=widgetStr, error='').strip()
+        return self.compileTemplate(self.normalFieldTpl).substitute(label=label, widget=widgetStr, error='').strip()
 
 class TableForm(BaseForm):
     '''A form that is rendered in a simple 3-column html table (label, widget, error)
@@ -340,31 +1483,17 @@ class RequirementsForm(BaseForm):
 
     reqLabelTpl = '<label class="required">$label</label>'
 
-    def renderField(self, name, value, error=None):
-        field = self[name]
-        widgetStr = field.renderer(name, value)
-
-        label = field.renderer.label
-        if label is not None:
-            template = self.normalFieldTpl
-        else:
-            template = self.bareFieldTpl
-        
-        if error:
-            errorStr = Template(self.errorTpl).substitute(error=error)
+    def fieldTemplate(self, field):
+        if field.renderer.label is not None:
+            return self.normalFieldTpl
         else:
-            errorStr = ''
+            return self.bareFieldTpl
 
-#       Test to determine whether this is a required field
-        try:
-            field.to_python(None)
-            req = False
-        except:
-            req = True
-
-        if not req:
-            labelStr = Template(self.labelTpl).substitute(label=label)
+    def renderLabel(self, field):
+        label = field.renderer.label
+        if label is None:
+            return ''
+        elif not self.isRequired(field):
+            return self.compileTemplate(self.labelTpl).substitute(label=label)
         else:
-            labelStr = Template(self.reqLabelTpl).substitute(label=label)
-
-        return Template(template).substitute(label=labelStr, widget=widgetStr, error=errorStr).strip()
+            return self.compileTemplate(self.reqLabelTpl).substitute(label=label)
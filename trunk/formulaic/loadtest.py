@@ -0,0 +1,360 @@
+#!/usr/bin/python
+"""
+loadtest - A reproducible load test for the formulaic form generation toolkit
+Copyright (C) 2005 Greg Steffensen, greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+import sys
+import threading
+import urllib
+from cStringIO import StringIO
+from timeit import default_timer
+
+from benchmarks import referenceForm, referenceValues
+
+__doc__ = '''A load test of form rendering at the level of whole requests.
+
+The test needs nothing but formulaic (and formencode): L{FormApplication} is a
+minimal WSGI application that serves one of the L{benchmarks} reference forms,
+rendering it for a first view on GET and parsing, validating and rendering it
+again on POST, as applications redisplaying a form do.  L{run} sends it a fixed
+mix of requests from a pool of threads or processes, either by calling it
+directly or over HTTP through a local wsgiref server, and reports throughput,
+latency percentiles and peak memory use::
+
+    python -m formulaic.loadtest --requests 5000 --concurrency 8 --shared
+
+With I{--shared}, one form instance serves every request of every thread, as
+in applications that build their forms once at startup.  Every response is
+compared with the response to the same request made ahead of time by a single
+thread, so that rendering that isn't safe to share between threads shows up as
+mismatches instead of going unnoticed.  Without it, each request builds its own
+form, as applications that build forms per request do.
+
+The request mix is determined by the number of requests alone, so runs before
+and after a change are comparable.'''
+
+#   The number of different submissions that POST requests cycle through
+VARIANTS = 7
+
+class FormApplication(object):
+    '''A WSGI application serving a reference form.
+
+    @ivar shared: whether one form serves every request (otherwise, each
+    request builds its own)
+    @ivar size: the size of the reference form (see
+    L{benchmarks.referenceForm})
+    '''
+
+    def __init__(self, shared=True, size=10):
+        self.shared = shared
+        self.size = size
+        if shared:
+            self.form = referenceForm(size=size)
+
+    def getForm(self):
+        if self.shared:
+            return self.form
+        return referenceForm(size=self.size)
+
+    def __call__(self, environ, start_response):
+        form = self.getForm()
+        if environ['REQUEST_METHOD'] == 'POST':
+            import cgi
+            from formencode.api import Invalid
+            storage = cgi.FieldStorage(fp=environ['wsgi.input'], environ=environ)
+            values = _submitted(form, storage)
+            try:
+                form.schema.to_python(values)
+                errors = {}
+            except Invalid, e:
+                errors = e.unpack_errors()
+            body = form.renderBytes(values, errors)
+        else:
+            body = form.renderBytes({}, {})
+
+        start_response('200 OK', [('Content-Type', 'text/html; charset=utf-8'),
+            ('Content-Length', str(len(body)))])
+        return [body]
+
+def _submitted(form, storage):
+    "Return the submitted values of a form's fields as a dict"
+    from values import adaptValues
+    values = adaptValues(storage)
+    submitted = {}
+    for name in form.iterkeys():
+        if name in values:
+            submitted[name] = values.get(name)
+    return submitted
+
+def requestFor(number, size=10, postPercent=50):
+    '''Return the method and body of one of the requests of a load test.
+
+    @param number: the number of the request
+    @type number: int
+    @param postPercent: the percentage of the requests that are POSTs
+    @type postPercent: int
+    @return: a (method, body) tuple; the body of GET requests is None
+    @rtype: tuple
+    '''
+    if number % 100 >= postPercent:
+        return 'GET', None
+    values = referenceValues(size)
+    values['name0'] = 'Name %d' % (number % VARIANTS)
+    return 'POST', urllib.urlencode(sorted(values.items()))
+
+def callApplication(application, method, body):
+    "Call a WSGI application directly with a request, and return the response body"
+    from wsgiref.util import setup_testing_defaults
+    environ = {'REQUEST_METHOD':method, 'wsgi.input':StringIO(body or '')}
+    if body is not None:
+        environ['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+        environ['CONTENT_LENGTH'] = str(len(body))
+    setup_testing_defaults(environ)
+    statuses = []
+    output = application(environ, lambda status, headers: statuses.append(status))
+    return ''.join(output)
+
+def serve(application):
+    '''Serve a WSGI application over HTTP from a background thread, on a free
+    local port, handling each request in its own thread.
+
+    @return: the server; its "server_port" attribute is the port it listens on,
+    and its "shutdown" method stops it
+    '''
+    from SocketServer import ThreadingMixIn
+    from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+
+    class ThreadingServer(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = make_server('127.0.0.1', 0, application, ThreadingServer, QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.setDaemon(True)
+    thread.start()
+    return server
+
+def callServer(port, method, body):
+    "Send a request to a local server, and return the response body"
+    import httplib
+    connection = httplib.HTTPConnection('127.0.0.1', port)
+    try:
+        headers = {}
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        connection.request(method, '/', body, headers)
+        return connection.getresponse().read()
+    finally:
+        connection.close()
+
+def percentile(times, fraction):
+    '''Return a percentile of a sorted list of times, by the nearest-rank
+    method.
+
+    >>> loadtest.percentile([1, 2, 3, 4], 0.5)
+    2
+    >>> loadtest.percentile([1, 2, 3, 4], 0.99)
+    4
+    '''
+    if not times:
+        return None
+    rank = int(fraction * len(times) + 0.999999) # rounded up
+    return times[max(rank, 1) - 1]
+
+def peakMemory():
+    '''Return the peak resident set size of this process and of its finished
+    child processes, in kilobytes, or None if it can't be measured here.
+
+    @rtype: tuple
+    '''
+    try:
+        import resource
+    except ImportError: # not on unix
+        return None, None
+    scale = 1
+    if sys.platform == 'darwin': # which reports bytes instead of kilobytes
+        scale = 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale)
+
+class _Driver(object):
+    "Sends a share of a load test's requests, and records their latencies"
+
+    def __init__(self, send, numbers, size, postPercent, expected):
+        self.send = send
+        self.numbers = numbers
+        self.size = size
+        self.postPercent = postPercent
+        self.expected = expected
+        self.latencies = []
+        self.mismatches = 0
+        self.errors = []
+
+    def run(self):
+        for number in self.numbers:
+            method, body = requestFor(number, self.size, self.postPercent)
+            start = default_timer()
+            try:
+                response = self.send(method, body)
+            except Exception, e:
+                self.errors.append('%s: %s' % (e.__class__.__name__, e))
+                continue
+            self.latencies.append(default_timer() - start)
+            if response != self.expected[method, body]:
+                self.mismatches += 1
+
+def _expectedResponses(requests, size, postPercent):
+    "Render every distinct request of a load test once, in a single thread"
+    application = FormApplication(shared=False, size=size)
+    expected = {}
+    for number in range(min(requests, 100 * VARIANTS)):
+        method, body = requestFor(number, size, postPercent)
+        if (method, body) not in expected:
+            expected[method, body] = callApplication(application, method, body)
+    return expected
+
+def _driveThreads(send, numbers, concurrency, size, postPercent, expected):
+    "Send requests from a pool of threads, and return their drivers"
+    drivers = [_Driver(send, numbers[i::concurrency], size, postPercent, expected)
+        for i in range(concurrency)]
+    threads = [threading.Thread(target=driver.run) for driver in drivers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return drivers
+
+#   The application and expected responses of a process pool, set up before the
+#   workers fork so that they inherit them
+_processState = {}
+
+def _processWorker(numbers):
+    "Run a share of the requests in a worker process"
+    state = _processState
+    driver = _Driver(state['send'], numbers, state['size'], state['postPercent'], state['expected'])
+    driver.run()
+    return driver.latencies, driver.mismatches, driver.errors
+
+def run(requests=1000, concurrency=4, processes=False, shared=True, http=False,
+    size=10, postPercent=50):
+    '''Run a load test, and return its measurements.
+
+    @param requests: how many requests to send
+    @type requests: int
+    @param concurrency: how many threads (or processes) send them
+    @type concurrency: int
+    @param processes: whether to send them from processes instead of threads
+    (each process then has its own copy of the application, forked from this
+    one)
+    @type processes: bool
+    @param shared: whether one form instance serves every request
+    @type shared: bool
+    @param http: whether to send them over HTTP, to a local server, instead of
+    calling the application directly
+    @type http: bool
+    @param size: the size of the reference form
+    @type size: int
+    @param postPercent: the percentage of the requests that are POSTs
+    @type postPercent: int
+    @return: a dict of the measurements: "requests" (how many succeeded),
+    "seconds", "throughput" (requests per second), "p50", "p95" and "p99"
+    (latencies, in seconds), "mismatches" (responses that differed from the
+    single-threaded ones), "errors" (a list of the failures) and "peakRSS" and
+    "peakChildRSS" (in kilobytes)
+    @rtype: dict
+    '''
+    expected = _expectedResponses(requests, size, postPercent)
+    application = FormApplication(shared, size)
+    server = None
+    if http:
+        server = serve(application)
+        port = server.server_port
+        send = lambda method, body: callServer(port, method, body)
+    else:
+        send = lambda method, body: callApplication(application, method, body)
+
+    numbers = range(requests)
+    latencies, mismatches, errors = [], 0, []
+    start = default_timer()
+    try:
+        if processes:
+            import multiprocessing
+            _processState.update(send=send, size=size, postPercent=postPercent, expected=expected)
+            pool = multiprocessing.Pool(concurrency)
+            try:
+                for results in pool.map(_processWorker, [numbers[i::concurrency] for i in range(concurrency)]):
+                    latencies.extend(results[0])
+                    mismatches += results[1]
+                    errors.extend(results[2])
+            finally:
+                pool.close()
+                pool.join()
+                _processState.clear()
+        else:
+            for driver in _driveThreads(send, numbers, concurrency, size, postPercent, expected):
+                latencies.extend(driver.latencies)
+                mismatches += driver.mismatches
+                errors.extend(driver.errors)
+        seconds = default_timer() - start
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    latencies.sort()
+    peakRSS, peakChildRSS = peakMemory()
+    return {'requests':len(latencies), 'seconds':seconds,
+        'throughput':len(latencies) / (seconds or 1e-9),
+        'p50':percentile(latencies, 0.5), 'p95':percentile(latencies, 0.95),
+        'p99':percentile(latencies, 0.99), 'mismatches':mismatches,
+        'errors':errors, 'peakRSS':peakRSS, 'peakChildRSS':peakChildRSS}
+
+def report(results):
+    "Format the measurements of a load test for printing"
+    lines = ['%(requests)d requests in %(seconds).2f s: %(throughput).1f requests/s' % results]
+    if results['requests']:
+        lines.append('latency: p50 %.2f ms, p95 %.2f ms, p99 %.2f ms' % (results['p50'] * 1000,
+            results['p95'] * 1000, results['p99'] * 1000))
+    if results['peakRSS'] is not None:
+        lines.append('peak RSS: %d kB (children: %d kB)' % (results['peakRSS'], results['peakChildRSS']))
+    lines.append('mismatched responses: %d' % results['mismatches'])
+    if results['errors']:
+        lines.append('failed requests: %d (first: %s)' % (len(results['errors']), results['errors'][0]))
+    return '\n'.join(lines)
+
+def main(arguments=None):
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog [options]', description='Load test formulaic with a local WSGI application.')
+    parser.add_option('-n', '--requests', type='int', default=1000, help='number of requests to send [%default]')
+    parser.add_option('-c', '--concurrency', type='int', default=4, help='number of threads or processes [%default]')
+    parser.add_option('-p', '--processes', action='store_true', default=False, help='use processes instead of threads')
+    parser.add_option('-s', '--shared', action='store_true', default=False, help='serve every request with one shared form')
+    parser.add_option('--http', action='store_true', default=False, help='send requests over HTTP to a local wsgiref server')
+    parser.add_option('--size', type='int', default=10, help='size of the reference form [%default]')
+    parser.add_option('--post-percent', type='int', default=50, help='percentage of POST requests [%default]')
+    options, arguments = parser.parse_args(arguments)
+
+    results = run(options.requests, options.concurrency, options.processes,
+        options.shared, options.http, options.size, options.post_percent)
+    print report(results)
+    if results['mismatches'] or results['errors']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/python
+"""
+registry - A registry of prebuilt forms for the formulaic form generation
+toolkit
+Copyright (C) 2005 Greg Steffensen, greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+import gc
+from odict import OrderedDict
+from forms import LazyField
+
+__doc__ = '''A registry of forms that can be fully built before a server forks.
+
+Servers that fork worker processes (i.e. "prefork" servers) get the most out of
+their memory when everything the workers share is built in the master process
+before the fork: the operating system then shares those pages between all
+workers for as long as nobody writes to them.  Register the application's forms
+with a L{FormRegistry} at startup, call its L{warm<FormRegistry.warm>} method
+in the master process, and then look the forms up by name in the workers::
+
+    forms = registry.FormRegistry()
+    forms.register('signup', buildSignupForm)
+    forms.warm()
+    # ... fork workers, which render forms['signup'] ...
+
+Warming builds every form, materializes its lazy fields, compiles its templates
+by rendering it once, and finally runs a full garbage collection.  On pythons
+that have gc.freeze, the surviving objects are then moved out of the garbage
+collector's reach, so that later collections in the workers don't write to
+(and so unshare) the pages they live on.  On pythons without it (including
+every python 2), warming instead makes full collections, the only ones that
+visit the objects that survived warming, rare: it raises the threshold of the
+oldest generation to L{FROZEN_THRESHOLD} (see gc.set_threshold).  Young objects
+are still collected as usual; workers that leave much cyclic garbage behind can
+call gc.collect() themselves now and then, i.e. between requests.
+
+Large select option lists can additionally be kept out of the process heap
+entirely; see the L{catalogs} module.'''
+
+#   The threshold of the oldest garbage collector generation after warming, on
+#   pythons without gc.freeze: how many collections of the middle generation
+#   happen before a full collection (the default is 10)
+FROZEN_THRESHOLD = 10000
+
+class FormRegistry(object):
+    '''An ordered collection of forms, looked up by name.
+
+    @ivar renderers: specialized render functions (see the L{codegen} module)
+    of the forms, by name, if warm was asked to create them
+    @ivar warmed: whether warm has been called
+    '''
+
+    def __init__(self):
+        self._factories = OrderedDict()
+        self._forms = {}
+        self.renderers = {}
+        self.warmed = False
+
+    def register(self, name, form):
+        '''Register a form under a name.
+
+        @param name: the name to look the form up by
+        @type name: str
+        @param form: either a form, or a callable taking no arguments that
+        builds the form (which is then only called when the form is first
+        needed, or when the registry is warmed)
+        '''
+        if callable(form):
+            self._factories[name] = form
+            self._forms.pop(name, None)
+        else:
+            self._factories[name] = None
+            self._forms[name] = form
+        self.renderers.pop(name, None)
+
+    def __getitem__(self, name):
+        try:
+            return self._forms[name]
+        except KeyError:
+            form = self._forms[name] = self._factories[name]()
+            return form
+
+    def __contains__(self, name):
+        return name in self._factories
+
+    def __iter__(self):
+        return iter(self._factories.keys())
+
+    def __len__(self):
+        return len(self._factories)
+
+    def names(self):
+        "Return the names of the registered forms, in the order they were registered"
+        return self._factories.keys()
+
+    def warm(self, materialize=True, specialize=False, cacheDirectory=None, freeze=True):
+        '''Build and prepare every registered form, so that nothing is left to
+        be built after the process forks.
+
+        @param materialize: whether to build the lazy fields of the forms
+        @type materialize: bool
+        @param specialize: whether to also generate specialized render
+        functions for the forms, which are stored in the I{renderers} attribute
+        @type specialize: bool
+        @param cacheDirectory: the directory to cache generated render functions
+        in (see L{codegen.specialize})
+        @param freeze: whether to keep the garbage collector from touching the
+        surviving objects, so that their memory stays shared after the process
+        forks: with gc.freeze where python has it, and otherwise by making full
+        collections rare (see L{FROZEN_THRESHOLD})
+        @type freeze: bool
+        '''
+        for name in self.names():
+            form = self[name]
+            if materialize:
+                for fieldName in form.iterkeys():
+                    if isinstance(dict.__getitem__(form, fieldName), LazyField):
+                        form[fieldName]
+#           rendering once compiles all of the form's templates
+            form.render({}, {})
+            if specialize:
+                import codegen
+                self.renderers[name] = codegen.specialize(form, cacheDirectory)
+
+        gc.collect()
+        if freeze:
+            if hasattr(gc, 'freeze'):
+                gc.freeze()
+            else:
+                threshold0, threshold1, threshold2 = gc.get_threshold()
+                gc.set_threshold(threshold0, threshold1, max(threshold2, FROZEN_THRESHOLD))
+        self.warmed = True
+
+defaultRegistry = FormRegistry()
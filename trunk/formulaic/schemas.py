@@ -0,0 +1,47 @@
+#!/usr/bin/python
+"""
+schemas - FormEncode integration for the formulaic form generation toolkit
+Copyright (C) 2005 Greg Steffensen, greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+from formencode import schema
+from odict import OrderedDict
+from forms import BaseForm
+import copy
+
+__doc__ = '''The formencode schema class used by formulaic forms.
+
+This lives in its own module so that importing the forms module doesn't import
+formencode; forms only import it the first time their "schema" attribute is
+used.'''
+
+class FormSchema(schema.Schema):
+    '''The formencode schema used by formulaic forms.
+
+    It behaves exactly like a normal formencode schema, except that fields of
+    the form that are hidden (see L{LazyField}) for the values being validated
+    are left out of the validation.
+    '''
+
+    def to_python(self, value_dict, state=None):
+        form = self.fields
+        if isinstance(form, BaseForm) and form.hasLazyFields():
+#           validate against a shallow copy, so that concurrent validations of
+#           the same form never see each other's set of visible fields
+            shadow = copy.copy(self)
+            shadow.fields = OrderedDict(form.visibleFields(value_dict or {}))
+            return super(FormSchema, shadow).to_python(value_dict, state)
+        return super(FormSchema, self).to_python(value_dict, state)
@@ -0,0 +1,184 @@
+#!/usr/bin/python
+"""
+subforms - Nested and repeated forms for the formulaic form generation toolkit
+Copyright (C) 2005 Greg Steffensen, greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+from basicwidgets.widgetclasses import Widget
+
+__doc__ = '''Fields that embed one form inside another, once or repeatedly.
+
+A L{SubForm} field renders the fields of another form (which can be any
+L{forms.BaseForm}) inside a I{<fieldset/>}, with their names prefixed the way
+formencode's variabledecode module expects, and validates the submitted values
+with that form's schema::
+
+    address = forms.BaseForm()
+    address['street'] = widgets.TextInput(validators.NotEmpty(), 'Street')
+    address['zip'] = widgets.TextInput(validators.Int(), 'Zip code')
+
+    form['home'] = subforms.SubForm(address, 'Home address')
+    form['items'] = subforms.SubForm(lineItem, 'Items', repeat=True, extra=1)
+
+The fields of the first are named "home.street" and "home.zip"; those of the
+second "items-0.product", "items-1.product" and so on.  Decode submissions with
+formencode.variabledecode.variable_decode before validating or rendering them,
+so that the value of a subform is a dict of the values of its fields (a list of
+such dicts for repeated subforms), and its error is a dict (or list) of their
+errors, as formencode reports them.
+
+However many times a subform is repeated, it only has one set of validators and
+widgets: every repetition is rendered by the embedded form with its own name
+prefix, and validated by the embedded form's schema.  The prefixed names are
+worked out (and interned) once per repetition, and reused from then on.
+Changes to the embedded form are noticed by the forms that embed it, but
+subforms shouldn't be added to forms as L{forms.LazyField}s.'''
+
+class SubFormWidget(Widget):
+    '''Renders the fields of an embedded form, once or repeatedly.
+
+    @ivar form: the embedded form
+    @ivar repeat: whether the form is repeated
+    @ivar minimum: the least number of repetitions to render
+    @ivar extra: how many empty repetitions to render after the submitted ones
+    @ivar attrs: html attributes for the I{<fieldset/>} element around each
+    repetition
+    @cvar groupTpl: the template for each repetition.  Takes two parameters:
+    I{$attributes} (the rendered I{attrs}, with a leading space) and I{$fields} (the rendered fields
+    of the embedded form)
+    @cvar separator: the string that repetitions are joined with
+    '''
+    widgetType = 'subform'
+    groupTpl = '<fieldset$attributes>\n$fields\n</fieldset>'
+    separator = '\n'
+
+#   tells forms to hand this widget the field's errors (see renderNested)
+    nested = True
+
+    def __init__(self, form, repeat=False, minimum=1, extra=0, attrs=None):
+        self.form = form
+        self.repeat = repeat
+        self.minimum = minimum
+        self.extra = extra
+        self.attrs = attrs or {}
+        self._prefixes = {}
+
+    def prefix(self, name, index=None):
+        '''Return the prefix of the names of the fields of one repetition,
+        i.e. "items-3." (or "home." for subforms that aren't repeated).
+
+        @param name: the name the subform is rendered with
+        @param index: the number of the repetition, or None if the subform
+        isn't repeated
+        '''
+        key = (name, index)
+        try:
+            return self._prefixes[key]
+        except KeyError:
+            if len(self._prefixes) >= 1024:
+                self._prefixes.clear()
+            if index is None:
+                prefix = '%s.' % name
+            else:
+                prefix = '%s-%d.' % (name, index)
+            if type(prefix) is str:
+                prefix = intern(prefix)
+            self._prefixes[key] = prefix
+            return prefix
+
+    def __call__(self, name, value):
+        return self.renderNested(name, value, None)
+
+    def renderNested(self, name, value, error, locale=None):
+        '''Render the subform with its values and errors.
+
+        @param name: the name the subform is rendered with
+        @param value: a dict of the values of the fields of the embedded form,
+        or a list of them for repeated subforms
+        @param error: a dict of the errors of the fields of the embedded form,
+        or a list of them (with None for repetitions without errors) for
+        repeated subforms; anything else is left for the form to render as the
+        subform's own error message
+        @param locale: the locale to translate the embedded form's labels into,
+        if any (see L{forms.BaseForm.renderLocalized})
+        @rtype: str
+        '''
+        template = self.form.compileTemplate(self.groupTpl)
+        attributes = ''
+        if self.attrs:
+            attributes = ' ' + self.renderAttributes(self.attrs)
+
+        if not self.repeat:
+            if not hasattr(value, 'get'):
+                value = {}
+            if not isinstance(error, dict):
+                error = {}
+            fields = self.form.renderFields(value, error, self.prefix(name), locale)
+            return template.substitute(attributes=attributes, fields=fields)
+
+        if not isinstance(value, (list, tuple)):
+            value = []
+        if not isinstance(error, (list, tuple)):
+            error = []
+        output = []
+        for index in range(max(len(value), self.minimum) + self.extra):
+            values, errors = {}, {}
+            if index < len(value) and hasattr(value[index], 'get'):
+                values = value[index]
+            if index < len(error) and isinstance(error[index], dict):
+                errors = error[index]
+            fields = self.form.renderFields(values, errors, self.prefix(name, index), locale)
+            output.append(template.substitute(attributes=attributes, fields=fields))
+        return self.separator.join(output)
+
+def SubForm(form, label, description='', repeat=False, minimum=1, extra=0, attrs=None):
+    '''Create a field embedding a form.
+
+    @param form: the form to embed
+    @type form: L{forms.BaseForm}
+    @param label: the label of the field
+    @type label: str
+    @param description: additional notes to be displayed with the field
+    @param repeat: whether the form is repeated, i.e. whether the field's value
+    is a list of submissions of the form
+    @type repeat: bool
+    @param minimum: the least number of repetitions to render
+    @type minimum: int
+    @param extra: how many empty repetitions to render after the submitted
+    ones (i.e. 1, for a blank row to add another item with)
+    @type extra: int
+    @param attrs: html attributes for the I{<fieldset/>} element around each
+    repetition
+    @type attrs: dict
+    @return: a validator, checking submissions (or a list of them) with the
+    embedded form's schema, with a L{SubFormWidget} as its renderer
+    '''
+    from formencode import compound, foreach
+    if repeat:
+        field = foreach.ForEach(form.schema)
+    else:
+        field = compound.All(form.schema)
+
+    field.renderer = SubFormWidget(form, repeat, minimum, extra, attrs)
+    field.renderer.renderBare = False
+    field.renderer.needsMultipart = False
+    for name in form.iterkeys():
+        if getattr(form[name].renderer, 'needsMultipart', False):
+            field.renderer.needsMultipart = True
+    field.renderer.label = label
+    field.renderer.default = None
+    field.renderer.description = description
+    return field
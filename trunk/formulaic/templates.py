@@ -0,0 +1,313 @@
+#!/usr/bin/python
+"""
+templates - Precompiled markup templates for the formulaic form generation
+toolkit
+Copyright (C) 2005 Greg Steffensen, greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+from string import Template
+import re
+
+__doc__ = '''Compilation of the template strings used by forms.
+
+Forms describe their markup with the same strings that python's string.Template
+accepts ("$name", "${name}" and "$$").  Rather than scanning those strings with
+a regular expression every time a form is rendered, formulaic splits each one
+once into its static text and its placeholders, and keeps the result in a small
+cache keyed by the template string itself.  Because the key is the string,
+assigning a new template to a form (or form class) never requires any explicit
+invalidation.
+
+Templates can also be compiled in "compact" mode, in which the whitespace
+between tags and placeholders, which is only there to make the markup readable,
+is removed once at compile time (see L{minifyTemplate}).
+
+Forms compile their templates through a B{template backend} (their
+I{templateBackend} attribute), so that other template engines can be plugged
+in.  A backend only needs a C{compile(source, compact)} method, returning an
+object with a C{substitute(**params)} method.  Templates that also have the
+I{statics} and I{names} attributes of a L{CompiledTemplate} let forms work out
+more of their rendering ahead of time (and be specialized by the L{codegen}
+module); forms render templates without them by substituting them whole.  Two
+backends are included:
+
+    - L{FragmentBackend} (the default), which compiles templates into
+      L{CompiledTemplate}s
+    - L{StringTemplateBackend}, which fills templates with string.Template
+      itself, and is mostly useful as the reference that other backends are
+      checked against
+
+L{checkBackend} checks a backend against string.Template on the templates of
+formulaic's own form classes.'''
+
+class CompiledTemplate(object):
+    '''A template string that has been split into static text and placeholders.
+
+    @ivar source: the original template string
+    @ivar statics: the static text of the template; there is always exactly one
+    more of these than there are placeholders
+    @ivar names: the names of the placeholders, in order
+    @ivar format: the template as a string to be used with the "%" operator and
+    a dict of parameters
+    '''
+
+    def __init__(self, source):
+        self.source = source
+        self.statics = []
+        self.names = []
+        self._encoded = {}
+
+        text = []
+        position = 0
+        for match in Template.pattern.finditer(source):
+            text.append(source[position:match.start()])
+            position = match.end()
+            if match.group('escaped') is not None:
+                text.append('$')
+            elif match.group('invalid') is not None:
+                lines = source[:match.start('invalid')].splitlines(True)
+                if not lines:
+                    column, line = 1, 1
+                else:
+                    column = match.start('invalid') - len(''.join(lines[:-1]))
+                    line = len(lines)
+                raise ValueError('Invalid placeholder in string: line %d, col %d' % (line, column))
+            else:
+                self.statics.append(''.join(text))
+                self.names.append(match.group('named') or match.group('braced'))
+                text = []
+        text.append(source[position:])
+        self.statics.append(''.join(text))
+
+#       Substitution is done with a single string formatting operation
+        parts = [self.statics[0].replace('%', '%%')]
+        for name, static in zip(self.names, self.statics[1:]):
+            parts.append('%%(%s)s' % name)
+            parts.append(static.replace('%', '%%'))
+        self.format = ''.join(parts)
+
+    def substitute(self, **kw):
+        '''Fill in the template, like string.Template.substitute.  Missing
+        parameters raise KeyError.
+
+        >>> templates.compileTemplate('<b>$label</b>').substitute(label='Hi')
+        '<b>Hi</b>'
+        '''
+        return self.format % kw
+
+    def encodedStatics(self, encoding):
+        '''Return the static text of the template encoded with the given
+        encoding.  The encoding is only done once per encoding.'''
+        try:
+            return self._encoded[encoding]
+        except KeyError:
+            encoded = [encodeText(static, encoding) for static in self.statics]
+            self._encoded[encoding] = encoded
+            return encoded
+
+_preformatted = re.compile(r'(<(textarea|pre)\b.*?</\2\s*>)', re.I | re.S)
+_interTag = re.compile(r'(>|\$\w+|\$\{\w+\})\s+(?=<|\$)')
+
+def minifyTemplate(source):
+    '''Remove the whitespace between tags and placeholders in a template
+    string, along with leading and trailing whitespace.  Whitespace inside
+    I{<textarea/>} and I{<pre/>} elements is preserved.
+
+    >>> templates.minifyTemplate('<p>\\n  $label\\n  $widget\\n</p>\\n')
+    '<p>$label$widget</p>'
+
+    @param source: a template string
+    @type source: str
+    @rtype: str
+    '''
+#   preformatted elements are swapped out for inert stand-in tags while the
+#   whitespace is removed, then swapped back in
+    preserved = []
+    def stash(match):
+        preserved.append(match.group(1))
+        return '<\x00%d\x00>' % (len(preserved) - 1)
+    source = _interTag.sub(r'\1', _preformatted.sub(stash, source))
+    for i, element in enumerate(preserved):
+        source = source.replace('<\x00%d\x00>' % i, element)
+    return source.strip()
+
+_cache = {}
+_cacheSize = 512
+
+def compileTemplate(source, compact=False):
+    '''Return the L{CompiledTemplate} for a template string, compiling it if it
+    hasn't been compiled before.
+
+    @param source: the template string
+    @type source: str
+    @param compact: whether to minify the template (see L{minifyTemplate})
+    before compiling it
+    @type compact: bool
+    '''
+    key = (source, compact)
+    try:
+        return _cache[key]
+    except KeyError:
+        if len(_cache) >= _cacheSize:
+            _cache.clear()
+        if compact:
+            compiled = CompiledTemplate(minifyTemplate(source))
+        else:
+            compiled = CompiledTemplate(source)
+        _cache[key] = compiled
+        return compiled
+
+def encodeText(text, encoding):
+    '''Encode a rendered fragment.  Unicode text is encoded, with characters
+    that the encoding can't represent replaced by html character references;
+    byte strings are assumed to already be in the right encoding.'''
+    if isinstance(text, unicode):
+        return text.encode(encoding, 'xmlcharrefreplace')
+    return text
+
+_encodedStatics = {}
+
+def encodeStatic(text, encoding):
+    '''Like L{encodeText}, but remembers the result.  Only use this for text
+    that is the same from render to render, such as field separators.'''
+    key = (text, encoding)
+    try:
+        return _encodedStatics[key]
+    except KeyError:
+        if len(_encodedStatics) >= _cacheSize:
+            _encodedStatics.clear()
+        encoded = _encodedStatics[key] = encodeText(text, encoding)
+        return encoded
+
+class TemplateBackend(object):
+    '''Base class for template backends.
+
+    @cvar name: a short name for the backend, for reports
+    '''
+    name = None
+
+    def compile(self, source, compact=False):
+        '''Compile a template string.
+
+        @param source: the template string
+        @type source: str
+        @param compact: whether to remove the whitespace that only makes the
+        template readable (see L{minifyTemplate})
+        @type compact: bool
+        @return: an object with a "substitute" method, which takes the template
+        parameters as keyword arguments, returns the filled in template and
+        raises KeyError for missing parameters
+        '''
+        raise NotImplementedError
+
+class FragmentBackend(TemplateBackend):
+    "The default backend, which splits templates into static text and placeholders once"
+    name = 'fragments'
+
+    def compile(self, source, compact=False):
+        return compileTemplate(source, compact)
+
+class _StringTemplate(object):
+    "A template filled in by string.Template"
+
+    def __init__(self, source):
+        self.source = source
+        self._template = Template(source)
+
+    def substitute(self, **kw):
+        return self._template.substitute(**kw)
+
+class StringTemplateBackend(TemplateBackend):
+    "A backend that fills templates in with string.Template, scanning them on every use"
+    name = 'string.Template'
+
+    def __init__(self):
+        self._cache = {}
+
+    def compile(self, source, compact=False):
+        key = (source, compact)
+        try:
+            return self._cache[key]
+        except KeyError:
+            if len(self._cache) >= _cacheSize:
+                self._cache.clear()
+            if compact:
+                source = minifyTemplate(source)
+            compiled = self._cache[key] = _StringTemplate(source)
+            return compiled
+
+defaultBackend = FragmentBackend()
+
+def templateSet():
+    '''Return the templates of formulaic's form classes, each with a set of
+    parameters that exercises the corner cases of substitution ("%" and "$"
+    signs, markup and non-ascii text).
+
+    @return: a list of (source, params) tuples
+    @rtype: list
+    '''
+    from forms import BaseForm, TableForm, RequirementsForm
+    sources = []
+    for formClass in (BaseForm, TableForm, RequirementsForm):
+        for attribute in ('formTpl', 'labelTpl', 'errorTpl', 'normalFieldTpl',
+            'bareFieldTpl', 'footer', 'reqLabelTpl'):
+            source = getattr(formClass, attribute, None)
+            if source is not None and source not in sources:
+                sources.append(source)
+#   a few that the form classes don't happen to use
+    sources.extend(['', '$$ and $${literal}', '${label}:$widget', '<pre>\n  $widget\n</pre>\n$error'])
+
+    templateSet = []
+    for source in sources:
+        params = {}
+        for i, name in enumerate(compileTemplate(source).names):
+            params[name] = u'<i>%d%% of $%s</i> \xe9' % (i, name)
+        templateSet.append((source, params))
+    return templateSet
+
+def checkBackend(backend, templates=None):
+    '''Check that a backend fills templates in exactly as string.Template
+    does, in both normal and compact mode.
+
+    >>> templates.checkBackend(templates.FragmentBackend())
+    []
+    >>> templates.checkBackend(templates.StringTemplateBackend())
+    []
+
+    @param backend: the backend to check
+    @type backend: L{TemplateBackend}
+    @param templates: the (source, params) tuples to check, by default those
+    of L{templateSet}
+    @return: a (source, compact, expected, actual) tuple for every template
+    that the backend filled in differently
+    @rtype: list
+    '''
+    if templates is None:
+        templates = templateSet()
+    mismatches = []
+    for source, params in templates:
+        for compact in (False, True):
+            if compact:
+                expected = Template(minifyTemplate(source)).substitute(**params)
+            else:
+                expected = Template(source).substitute(**params)
+            try:
+                actual = backend.compile(source, compact).substitute(**params)
+            except Exception, e:
+                actual = e
+            if actual != expected:
+                mismatches.append((source, compact, expected, actual))
+    return mismatches
@@ -0,0 +1,125 @@
+#!/usr/bin/python
+"""
+values - Adapters for submitted value containers for the formulaic form
+generation toolkit
+Copyright (C) 2005 Greg Steffensen, greg.steffensen@gmail.com
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+import sys
+
+__doc__ = '''Adapters that let forms read submitted values straight from request
+objects.
+
+Forms only need three things from the values they are rendered with, which
+make up the B{value source} protocol:
+
+    - C{get(name, default=None)}: the value submitted for a field, or
+      I{default} if nothing was submitted.  Fields submitted more than once
+      give a list of values.
+    - C{name in values}: whether anything was submitted for a field.
+    - C{keys()}: the names of everything that was submitted.
+
+Plain dicts already implement this protocol.  The adapters here wrap the
+multi-valued containers that web frameworks hand out (cgi.FieldStorage, and the
+"MultiDict" classes of WebOb, Paste and friends) without copying them, so that
+they can be passed directly to the rendering methods of a form.
+'''
+
+class MultiDictValues(object):
+    '''A value source for multi-dicts, i.e. dict-like objects that can hold
+    several values per key and offer a "getall" (WebOb, Paste) or "getlist"
+    (Werkzeug, Django) method to fetch them.'''
+
+    def __init__(self, source):
+        self.source = source
+        if hasattr(source, 'getall'):
+            self._getall = source.getall
+        else:
+            self._getall = source.getlist
+
+    def get(self, name, default=None):
+        items = self._getall(name)
+        if not items:
+            return default
+        elif len(items) == 1:
+            return items[0]
+        return list(items)
+
+    def __contains__(self, name):
+        return name in self.source
+
+    def keys(self):
+        return self.source.keys()
+
+class FieldStorageValues(object):
+    '''A value source for cgi.FieldStorage instances.  File uploads are
+    returned as their FieldStorage items; everything else is returned as
+    strings.'''
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    @staticmethod
+    def _value(item):
+        if item.filename:
+            return item
+        return item.value
+
+    def get(self, name, default=None):
+        if name not in self:
+            return default
+        item = self.storage[name]
+        if isinstance(item, list):
+            return [self._value(i) for i in item]
+        return self._value(item)
+
+    def __contains__(self, name):
+#       FieldStorage refuses membership tests when nothing was parsed
+        if self.storage.list is None:
+            return False
+        return name in self.storage
+
+    def keys(self):
+        if self.storage.list is None:
+            return []
+        return self.storage.keys()
+
+def adaptValues(values):
+    '''Return a value source for a container of submitted values.
+
+    Plain dicts, and anything else that already implements the value source
+    protocol, are returned unchanged.  None is treated as an empty submission.
+
+    >>> values.adaptValues({'a':'b'})
+    {'a': 'b'}
+
+    @param values: the submitted values, i.e. a dict, a cgi.FieldStorage or a
+    multi-dict
+    @return: an object implementing the value source protocol
+    '''
+    if values is None:
+        return {}
+    elif type(values) is dict:
+        return values
+#   FieldStorage has a getlist method too, so it has to be tested first.  If the
+#   cgi module hasn't been imported, values can't be a FieldStorage, and there's
+#   no need to pay for importing it.
+    cgi = sys.modules.get('cgi')
+    if cgi is not None and isinstance(values, cgi.FieldStorage):
+        return FieldStorageValues(values)
+    elif hasattr(values, 'getall') or hasattr(values, 'getlist'):
+        return MultiDictValues(values)
+    return values